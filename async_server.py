@@ -0,0 +1,805 @@
+import asyncio
+import json
+import secrets
+import time
+import traceback
+import argparse
+from game import *
+from engine import *
+from tables import *
+from netio import OUTBOX_HIGH_WATER
+from protocol import *
+from supervisor import *
+from eventlog import *
+from metrics import *
+from tournament import *
+
+# asyncio version of server.py: every connection is a coroutine on a single
+# event loop instead of its own OS thread, and one process hosts many tables
+# (see tables.py). --workers runs several such processes on the same port
+# (see supervisor.py). Speaks the same protocol as server.py, so player.py
+# connects to either server unchanged.
+#
+# Nothing in a game waits for a client's socket: writes land in the
+# connection's transport buffer, which the event loop sends as the client
+# reads. That buffer is the player's outbound queue; once it holds more than
+# OUTBOX_HIGH_WATER bytes the client is too far behind and is dropped.
+#
+# Framed players are PINGed every HEARTBEAT_INTERVAL seconds and answer
+# PONG, which gives their round trip time; one that has sent nothing for
+# LIVENESS_TIMEOUT seconds is treated as disconnected. A framed player whose
+# connection goes away mid-game is detached rather than removed: their seat
+# is held for RESUME_GRACE seconds (auto-playing on the decision deadline)
+# and they can reconnect with their resume token to carry on.
+#
+# Any number of spectators can WATCH a table. They are never written to from
+# the game loop: broadcasts append their framed bytes (encoded once, already
+# shared by every framed player) to the table's feed, and the table's fanOut
+# task writes each batch of the feed as one bytes object to every spectator,
+# at most every FANOUT_INTERVAL seconds so a busy table costs one write per
+# spectator per interval rather than per message.
+# A spectator that falls OUTBOX_HIGH_WATER behind is dropped like a player.
+#
+# Each table is owned by its runTable task. Seating a player happens on the
+# accept task with no await between find_table and the seat being taken, so
+# it can't interleave with anything; after that only the owner changes the
+# table. A player leaving just closes their connection and sets
+# state.changed, and the owner sweeps them up. Tables share no lock, and the
+# metrics thread reads only each table's state.view (see game.TableView).
+
+LISTEN_BACKLOG = 1024
+HEARTBEAT_INTERVAL = 5
+LIVENESS_TIMEOUT = 15
+FANOUT_INTERVAL = 0.05  # seconds the feed collects between sends to spectators
+
+class PlayerConn:
+    def __init__(self, reader, writer):
+        self.reader = reader
+        self.writer = writer
+        self.lines = asyncio.Queue()  # decisions read by watchPlayer, None on EOF
+        self.closed = False
+        self.version = TEXT           # wire protocol version, negotiated at join
+        self.acked = asyncio.Event()  # set when the client sends ACK
+        self.token = None             # resume token, framed players only
+        self.detachedAt = None        # loop time the connection dropped, while the seat is held
+        self.pending = None           # (card, deadline) of an unanswered DECISION
+        self.lastSeen = asyncio.get_running_loop().time()
+        self.pingSent = None          # loop time of the unanswered PING
+        self.rtt = None               # seconds, from the last PONG
+        self.username = None
+        self.table = None             # Table the player sits at; a tournament moves them
+        self.seat = None
+
+    def write(self, data):
+        if self.closed:
+            raise ConnectionResetError("player connection closed")
+        if self.detachedAt is not None:
+            return  # they get a SNAPSHOT when they resume
+        self.writer.write(data)
+        if self.writer.transport.get_write_buffer_size() > OUTBOX_HIGH_WATER:
+            self.writer.transport.abort()
+            self.close()
+            raise ConnectionResetError("outbound queue over high-water mark")
+
+    def message(self, msgType, *fields):
+        self.write(encode(self.version, msgType, *fields))
+
+    async def readLine(self):
+        msg = await self.reader.readline()
+        return msg.decode()[:-1]
+
+    async def getLine(self):
+        line = await self.lines.get()
+        if line is None:
+            raise ConnectionResetError("player connection closed")
+        return line
+
+    def close(self):
+        self.closed = True
+        self.lines.put_nowait(None)
+        try:
+            self.writer.close()
+        except Exception:
+            pass
+
+    def detach(self):
+        # the socket is gone but the seat is kept for a resume
+        self.detachedAt = asyncio.get_running_loop().time()
+        try:
+            self.writer.close()
+        except Exception:
+            pass
+
+    def attach(self, reader, writer, version):
+        # carry on over a new connection; the old one is cut if still open
+        if self.detachedAt is None:
+            self.writer.transport.abort()
+        self.reader = reader
+        self.writer = writer
+        self.version = version
+        self.detachedAt = None
+        self.lastSeen = asyncio.get_running_loop().time()
+        self.pingSent = None
+
+    def pong(self):
+        now = asyncio.get_running_loop().time()
+        if self.pingSent is not None:
+            self.rtt = now - self.pingSent
+            self.pingSent = None
+
+def broadcast(state, msgType, *fields):
+    # Only queues the message; a player who can't take it is skipped and
+    # caught by the next direct send
+    start = time.perf_counter()
+    encoded = {}  # protocol version -> bytes, so each format is encoded once
+    encoder = encode_repeated if msgType == "WAITING" else encode
+    for seat, conn in list(state.playerConnections.items()):
+        data = encoded.get(conn.version)
+        if data is None:
+            data = encoded[conn.version] = encoder(conn.version, msgType, *fields)
+        try:
+            conn.write(data)
+        except (BrokenPipeError, ConnectionResetError):
+            continue
+    if state.spectators:
+        publish(state, encoded.get(FRAMED) or encoder(FRAMED, msgType, *fields))
+    BROADCAST_SECONDS.observe(time.perf_counter() - start)
+
+def broadcastTable(state):
+    # Full TABLE for text clients, TABLE_DELTA for framed ones
+    start = time.perf_counter()
+    delta = table_delta(state)
+    encoded = {
+        TEXT: table_frame(state),
+        FRAMED: encode(FRAMED, "TABLE_DELTA", state.tableSeq, json.dumps(delta)),
+    }
+    for seat, conn in list(state.playerConnections.items()):
+        try:
+            conn.write(encoded[conn.version])
+        except (BrokenPipeError, ConnectionResetError):
+            continue
+    if state.spectators:
+        publish(state, encoded[FRAMED])
+    BROADCAST_SECONDS.observe(time.perf_counter() - start)
+
+def send_snapshot(state, conn):
+    # the table for a joining or resyncing player: SNAPSHOT as of the last
+    # broadcastTable, or the whole current table for text clients
+    conn.write(table_frame(state) if conn.version == TEXT else snapshot_frame(state))
+
+def publish(state, data):
+    # queue framed bytes for every spectator of the table
+    state.feed.append(data)
+    state.feedReady.set()
+
+async def fanOut(state):
+    # Everything published since the last pass goes out as one bytes object,
+    # the same one for every spectator. Spectators who just joined or asked
+    # to RESYNC get a SNAPSHOT after the batch, so it is never older than a
+    # delta they are sent later.
+    while not state.closed:
+        await state.feedReady.wait()
+        state.feedReady.clear()
+        if state.feed:
+            data = b"".join(state.feed)
+            state.feed.clear()
+            for conn in list(state.spectators):
+                try:
+                    conn.write(data)
+                except ConnectionResetError:
+                    state.spectators.discard(conn)
+        if state.joining:
+            joining, state.joining = state.joining, []
+            snapshot = snapshot_frame(state)
+            for conn in joining:
+                try:
+                    conn.write(snapshot)
+                    state.spectators.add(conn)
+                except ConnectionResetError:
+                    pass
+        await asyncio.sleep(FANOUT_INTERVAL)
+
+def resyncSpectator(state, conn):
+    state.spectators.discard(conn)
+    state.joining.append(conn)
+    state.feedReady.set()
+
+async def handlePlayer(manager, reader, writer):
+    clientAddr = writer.get_extra_info('peername')
+    print(f"Received connection from {clientAddr[0]}:{clientAddr[1]}")
+    conn = PlayerConn(reader, writer)
+    try:
+        line = await conn.readLine()
+        watch = watch_request(line)
+        if watch is not None:
+            conn.version, tableId = watch
+            conn.write(welcome(conn.version))
+            await handleSpectator(manager, conn, tableId)
+            return
+        conn.version, username, token = negotiate(line)
+    except (ConnectionResetError, UnicodeDecodeError, ValueError):
+        conn.close()
+        return
+    if not username and token is None:
+        conn.close()
+        return
+    if greeted(line):
+        conn.write(welcome(conn.version))
+    if token is not None:
+        await resumePlayer(manager, conn, token)
+        return
+    conn.username = username
+    if manager.tournament is not None:
+        await registerPlayer(manager, conn)
+        return
+
+    # no awaits between find_table and seatPlayer, so joins can't interleave
+    state, reason = manager.find_table()
+    if state is None:
+        print(f"REJECTED CONNECTION: {reason}")
+        rejectPlayer(conn, reason)
+        return
+
+    seatPlayer(state, conn)
+    await watchPlayer(conn)
+
+def seatPlayer(state, conn):
+    seat = addPlayer(state, conn.username)
+
+    if state.dealer is None:
+        state.dealer = seat
+
+    print(f"[table {state.id}] Current table:", state.table)
+
+    # everyone else gets the new seat as a delta, the new player the whole table
+    broadcastTable(state)
+    try:
+        send_snapshot(state, conn)
+        if conn.version != TEXT:
+            if conn.token is None:
+                conn.token = secrets.token_hex(16)
+                conn.message("RESUME_TOKEN", conn.token)
+            state.tokens[conn.token] = seat
+    except ConnectionResetError:
+        pass
+    state.playerConnections[seat] = conn
+    conn.table, conn.seat = state, seat
+    # a tournament player may have waited a while for this table: only
+    # silence from now on counts against them
+    conn.lastSeen = asyncio.get_running_loop().time()
+    conn.pingSent = None
+    update_view(state)
+    state.changed.set()
+
+async def resumePlayer(manager, conn, token):
+    state, seat = manager.find_seat(token)
+    held = state.playerConnections.get(seat) if state is not None else None
+    if held is None or held.closed:
+        print("REJECTED CONNECTION: RESUME_FAILED")
+        rejectPlayer(conn, "RESUME_FAILED")
+        return
+
+    held.attach(conn.reader, conn.writer, conn.version)
+    print(f"[table {state.id}] Player {state.table[seat][0]} resumed seat {seat}")
+    try:
+        send_snapshot(state, held)
+        if held.pending is not None:
+            # they dropped while deciding: ask again with what's left of the deadline
+            card, deadline = held.pending
+            held.message("DEADLINE", round(max(deadline - asyncio.get_running_loop().time(), 0), 1))
+            held.message("DECISION", card)
+    except ConnectionResetError:
+        pass
+    await watchPlayer(held)
+
+async def handleSpectator(manager, conn, tableId):
+    state = manager.find_watch_table(tableId)
+    if state is None:
+        print("REJECTED SPECTATOR: NO_TABLE")
+        rejectPlayer(conn, "NO_TABLE")
+        return
+    if state.fanOut is None:
+        state.fanOut = asyncio.ensure_future(fanOut(state))
+    resyncSpectator(state, conn)
+    await watchSpectator(state, conn)
+
+def rejectPlayer(conn, reason):
+    try:
+        conn.message("REJECTED", reason)
+    except (BrokenPipeError, ConnectionResetError):
+        pass
+    conn.close()
+
+async def watchPlayer(conn):
+    # Only reader of the socket once seated: queues decisions for
+    # get_player_action and notices disconnects as soon as they happen.
+    # The player's table is looked up on conn each time, since a tournament
+    # moves them from table to table (and has them at none in between).
+    loop = asyncio.get_running_loop()
+    reader = conn.reader
+    try:
+        while True:
+            msgType, fields = await read_message_async(reader, conn.version)
+            if msgType is None:
+                break
+            conn.lastSeen = loop.time()
+            if msgType == "ACTION":
+                conn.lines.put_nowait(fields[0])
+            elif msgType == "ACK":
+                conn.acked.set()
+            elif msgType == "RESYNC" and conn.table is not None:
+                send_snapshot(conn.table, conn)
+            elif msgType == "PONG":
+                conn.pong()
+    except (BrokenPipeError, ConnectionResetError, UnicodeDecodeError, ValueError, IndexError):
+        pass
+    if conn.reader is not reader:
+        return  # the player resumed on a new connection
+    state, seat = conn.table, conn.seat
+    if state is None:
+        conn.close()    # a tournament skips them when it next seats them
+        return
+
+    others = [other for other in state.playerConnections.values()
+              if other is not conn and not other.closed and other.detachedAt is None]
+    if conn.token is not None and state.gameRunning and not conn.closed and others:
+        conn.detach()
+        print(f"[table {state.id}] Player {state.table[seat][0]} dropped, holding seat {seat} for {state.resumeGrace}s")
+        loop.call_later(state.resumeGrace, expireSeat, state, seat, conn, conn.detachedAt)
+        return
+    await playerLeft(state, seat, conn)
+
+async def watchSpectator(state, conn):
+    # Spectators only ever send PONG, RESYNC and the ACKs player.py sends
+    # after a reveal, which nothing waits for
+    loop = asyncio.get_running_loop()
+    try:
+        while True:
+            msgType, fields = await read_message_async(conn.reader, conn.version)
+            if msgType is None:
+                break
+            conn.lastSeen = loop.time()
+            if msgType == "RESYNC":
+                resyncSpectator(state, conn)
+            elif msgType == "PONG":
+                conn.pong()
+    except (BrokenPipeError, ConnectionResetError, UnicodeDecodeError, ValueError, IndexError):
+        pass
+    state.spectators.discard(conn)
+    conn.close()
+
+def closeSpectators(state):
+    # the table is gone: tell its spectators and hang up
+    for conn in list(state.spectators) + state.joining:
+        rejectPlayer(conn, "TABLE_CLOSED")
+    state.spectators.clear()
+    state.joining.clear()
+    state.feed.clear()
+    state.feedReady.set()   # lets fanOut see state.closed
+
+def expireSeat(state, seat, conn, detachedAt):
+    if conn.detachedAt != detachedAt:
+        return  # resumed (and maybe dropped again since)
+    print(f"[table {state.id}] Seat {seat} was not resumed in time")
+    asyncio.ensure_future(playerLeft(state, seat, conn))
+
+async def playerLeft(state, seat, conn):
+    # Only runTable changes the table once a player is seated: a running
+    # game finds out on its next send/decision, the lobby when it wakes
+    conn.close()
+    state.changed.set()
+
+async def handleDisconnect(state):
+    for seat, conn in list(state.playerConnections.items()):
+        if not conn.closed:
+            continue
+        username = state.table[seat][0]
+        print(f"[table {state.id}] Player {username} disconnected from seat {seat}")
+
+        # Remove from connections and table
+        state.tokens.pop(conn.token, None)
+        del state.playerConnections[seat]
+        del state.table[seat]
+        del state.timeouts[seat]
+        state.playerCount -= 1
+        DISCONNECTS.inc()
+
+    if state.playerCount == 0:
+        state.dealer = None
+
+    state.gameRunning = False
+    update_view(state)
+
+def say(state, line):
+    # a WAITING line from the lobby, if it gave one
+    if line is not None:
+        broadcast(state, "WAITING", line)
+
+async def waitInLobby(state):
+    # Sleep until a player joins or leaves or the lobby's countdown timer is
+    # due (see lobby.py), then tell the lobby
+    loop = asyncio.get_running_loop()
+    lobby = state.lobby
+    if not state.changed.is_set():
+        try:
+            await asyncio.wait_for(state.changed.wait(), lobby.timeout(loop.time()))
+        except asyncio.TimeoutError:
+            pass
+    now = loop.time()
+    if state.changed.is_set():
+        state.changed.clear()
+        if any(conn.closed for conn in state.playerConnections.values()):
+            await handleDisconnect(state)
+            if state.playerCount > 0:
+                if state.dealer not in state.table:
+                    new_dealer(state)
+                broadcastTable(state)
+        say(state, lobby.players_changed(state.playerCount, state.pacing.delay("countdown"), now))
+    say(state, lobby.tick(now))
+    if lobby.phase == RUNNING:
+        state.gameRunning = True
+        update_view(state)
+        print(f"[table {state.id}] GAME STARTED")
+
+async def get_player_action(state, seat, conn, card):
+    # The player's answer, or DEFAULT_ACTION once their deadline has passed
+    timeout = state.pacing.decisionTimeout
+    # an answer that missed an earlier deadline is still queued: drop it
+    while not conn.lines.empty():
+        if conn.lines.get_nowait() is None:
+            raise ConnectionResetError("player connection closed")
+    if conn.version != TEXT:
+        conn.message("DEADLINE", timeout)
+    conn.message("DECISION", card)
+    conn.pending = (card, asyncio.get_running_loop().time() + timeout)
+    start = time.perf_counter()
+    try:
+        action = await asyncio.wait_for(conn.getLine(), timeout + DECISION_GRACE)
+        DECISION_SECONDS.observe(time.perf_counter() - start)
+        return action
+    except asyncio.TimeoutError:
+        DECISION_SECONDS.observe(time.perf_counter() - start)
+        DECISION_TIMEOUTS.inc()
+        count = record_timeout(state, seat)
+        print(f"[table {state.id}] Player {state.table[seat][0]} ran out of time ({count} timeouts), playing {DEFAULT_ACTION}")
+        return DEFAULT_ACTION
+    finally:
+        conn.pending = None
+
+async def pause(state, point):
+    start = time.perf_counter()
+    if point in state.pacing.acks:
+        await wait_for_acks(state)
+    else:
+        delay = state.pacing.delay(point)
+        if delay:
+            await asyncio.sleep(delay)
+    PACING_SECONDS.inc(time.perf_counter() - start, point)
+
+async def wait_for_acks(state):
+    # Framed clients send ACK once they have caught up; text clients never
+    # do, so they aren't waited for
+    waits = [asyncio.ensure_future(conn.acked.wait()) for conn in state.playerConnections.values()
+             if conn.version != TEXT and not conn.closed and conn.detachedAt is None]
+    if waits:
+        done, pending = await asyncio.wait(waits, timeout=state.pacing.ackTimeout)
+        for wait in pending:
+            wait.cancel()
+    for conn in state.playerConnections.values():
+        conn.acked.clear()
+
+async def play_event(state, event):
+    # Turn one engine event into messages/pauses; answers decisions
+    kind = event[0]
+    if kind == "table":
+        broadcastTable(state)
+    elif kind == "pause":
+        await pause(state, event[1])
+    elif kind == "new_deck":
+        RESHUFFLES.inc()
+        print(f"[table {state.id}] NEW DECK")
+    elif kind == "deal":
+        ROUNDS.inc()
+        _, order, flip_order, hands = event
+        flip_order_string = create_list_string(flip_order)
+        for seat in order:
+            conn = state.playerConnections[seat]
+            if seat in hands:
+                conn.message("DEAL", flip_order_string, NAMES[hands[seat][0]])
+            else:
+                conn.message("DEAL", flip_order_string, "NONE")
+        if state.spectators:
+            publish(state, encode(FRAMED, "DEAL", flip_order_string, "NONE"))
+        print(f"[table {state.id}]", hand_strs(hands))
+    elif kind == "flip":
+        broadcast(state, "FLIP_CARD", event[1], NAMES[event[2]])
+    elif kind == "decision":
+        return await get_player_action(state, event[1], state.playerConnections[event[1]], NAMES[event[2]])
+    elif kind == "new_card":
+        state.playerConnections[event[1]].message("NEW_CARD", NAMES[event[2]])
+    elif kind == "action":
+        broadcast(state, "PLAYER_ACTION", event[1], event[2])
+    elif kind == "reveal":
+        _, flip_order, hands = event
+        print(f"[table {state.id}]", hand_strs(hands))
+        broadcast(state, "REVEAL", create_list_string(flip_order), json.dumps(hand_strs(hands)))
+    elif kind == "losers":
+        _, losing_seats, losing_cards = event
+        losing_usernames = [state.table[seat][0] for seat in losing_seats]
+        broadcast(state, "LOSERS", create_list_string(losing_usernames), create_list_string([NAMES[card] for card in losing_cards]))
+
+async def runGame(state):
+    print(f"[table {state.id}] TABLE", state.table)
+
+    state.deck.new_game()
+    recorder = GameRecorder(state.log, state) if state.log is not None else None
+    events = game_events(state) if recorder is None else game_events(state, recorder.new_deck)
+    decision = None
+    while True:
+        try:
+            event = events.send(decision)
+        except StopIteration as done:
+            state.gameRunning = False
+            update_view(state)
+            if recorder is not None:
+                recorder.end(done.value)
+            GAMES.inc()
+            return done.value
+        start = time.perf_counter()
+        decision = await play_event(state, event)
+        if recorder is not None:
+            recorder.event(event, decision, time.perf_counter() - start)
+
+async def runTable(manager, state):
+    loop = asyncio.get_running_loop()
+    countdown = state.pacing.delay("countdown")
+    while True:
+        try:
+            if state.playerCount == 0 and not state.gameRunning:
+                manager.close_table(state)
+                closeSpectators(state)
+                return
+            elif state.lobby.phase == RUNNING:
+                winner = await runGame(state)
+                state.lobby.game_over()
+                print(f"[table {state.id}] Game over - {winner} wins")
+                # broadcast table message of who won
+                broadcastTable(state)
+                broadcast(state, "WAITING", f"Gamer Over - {winner} wins")
+                await pause(state, "game_over")
+
+                # players who left during the game are swept up now,
+                # including dropped ones still holding their seat
+                for conn in state.playerConnections.values():
+                    if conn.detachedAt is not None:
+                        conn.close()
+                await handleDisconnect(state)
+                if state.playerCount > 0:
+                    # reset table state
+                    reset_lives(state)
+
+                    # send new table info
+                    broadcastTable(state)
+                state.gameRunning = False
+                say(state, state.lobby.reopen(state.playerCount, countdown, loop.time()))
+            else:
+                await waitInLobby(state)
+        except (BrokenPipeError, ConnectionResetError):
+            await handleDisconnect(state)
+            print(f"[table {state.id}] Current table:", state.table)
+            # Notify remaining players
+            print(f"[table {state.id}] player count {state.playerCount}")
+            if state.playerCount > 0:
+                reset_lives(state)
+                broadcastTable(state)
+            await pause(state, "disconnect")
+            broadcast(state, "WAITING", "Player disconnected - ended game")
+            await pause(state, "disconnect_notice")
+            say(state, state.lobby.reopen(state.playerCount, countdown, loop.time()))
+
+async def registerPlayer(manager, conn):
+    # Tournament mode: the player waits, at no table, until enough have
+    # registered; the tournament seats them from then on
+    tournament = manager.tournament
+    if tournament.started is not None:
+        print("REJECTED CONNECTION: TOURNAMENT_RUNNING")
+        rejectPlayer(conn, "TOURNAMENT_RUNNING")
+        return
+    if tournament.register(conn):
+        # players who left while waiting don't count
+        tournament.players = [player for player in tournament.players if not player.closed]
+    if len(tournament.players) >= tournament.size:
+        tournament.start()
+    else:
+        try:
+            conn.message("WAITING", f"Registered for the tournament ({len(tournament.players)}/{tournament.size} players)")
+        except ConnectionResetError:
+            pass
+    await watchPlayer(conn)
+
+def startTournamentTable(manager, entry):
+    state = manager.new_table()
+    state.task = asyncio.ensure_future(playTournamentTable(manager, state, entry))
+    return state.id
+
+async def playTournamentTable(manager, state, entry):
+    # One tournament table: seat its players, play until one of them has
+    # won, then send the losers home and the winner back to the scheduler
+    for conn in entry.players:
+        if not conn.closed:
+            seatPlayer(state, conn)
+    print(f"[table {state.id}] tournament round {entry.round}")
+    broadcast(state, "WAITING", f"Tournament round {entry.round}")
+    winner = None
+    try:
+        while winner is None and state.playerCount > 1:
+            await pause(state, "table")
+            state.gameRunning = True
+            update_view(state)
+            try:
+                name = await runGame(state)
+            except (BrokenPipeError, ConnectionResetError):
+                # play it again without whoever left
+                await handleDisconnect(state)
+                if state.playerCount > 0:
+                    reset_lives(state)
+                    broadcastTable(state)
+                await pause(state, "disconnect")
+                broadcast(state, "WAITING", "Player disconnected - game starts again")
+                await pause(state, "disconnect_notice")
+                continue
+            winner = state.playerConnections[generate_flip_order(state)[0]]
+            print(f"[table {state.id}] Game over - {name} wins")
+            broadcastTable(state)
+            broadcast(state, "WAITING", f"Gamer Over - {name} wins")
+            await pause(state, "game_over")
+        if winner is None and state.playerCount == 1:
+            winner = next(iter(state.playerConnections.values()))
+
+        for conn in state.playerConnections.values():
+            if conn is not winner:
+                try:
+                    conn.message("WAITING", f"Knocked out in round {entry.round}")
+                except ConnectionResetError:
+                    pass
+            conn.table = conn.seat = None
+    finally:
+        manager.close_table(state)
+        closeSpectators(state)
+        manager.tournament.table_done(entry, winner)
+
+def endTournament(manager, champion, finished):
+    line = f"Tournament over - {'nobody' if champion is None else champion.username} wins"
+    for conn in manager.tournament.players:
+        if not conn.closed:
+            try:
+                conn.message("WAITING", line)
+            except ConnectionResetError:
+                pass
+            conn.close()
+    finished.set()
+
+async def heartbeat(manager, interval, liveness):
+    # PING every framed player each interval; cut the connection of anyone
+    # silent for longer than liveness, and watchPlayer takes it from there
+    loop = asyncio.get_running_loop()
+    while True:
+        await asyncio.sleep(interval)
+        checkLiveness(manager, loop.time(), liveness)
+
+def checkLiveness(manager, now, liveness):
+    conns = []
+    for state in list(manager.tables.values()):
+        conns += list(state.playerConnections.values()) + list(state.spectators)
+    if manager.tournament is not None:
+        # registered or between tables, so dead peers are found there too
+        conns += [conn for conn in manager.tournament.players if conn.table is None]
+    for conn in conns:
+        if conn.version == TEXT or conn.closed or conn.detachedAt is not None:
+            continue
+        if now - conn.lastSeen > liveness:
+            conn.writer.transport.abort()
+        elif conn.pingSent is None:
+            conn.pingSent = now
+            try:
+                conn.message("PING")
+            except ConnectionResetError:
+                pass
+
+async def main(port, maxTables=None, pacing=NORMAL, sock=None, heartbeatInterval=HEARTBEAT_INTERVAL,
+               livenessTimeout=LIVENESS_TIMEOUT, resumeGrace=RESUME_GRACE, eventLog=None, metricsPort=None,
+               seed=None, tournament=None):
+    # eventLog: path games are recorded to, see eventlog.py
+    # metricsPort: serve Prometheus metrics there, see metrics.py
+    # seed: makes every table's decks reproducible, see game.Deck
+    # tournament: play one knockout tournament for this many players and
+    # exit, see tournament.py
+    log = EventLog(eventLog) if eventLog is not None else None
+    manager = TableManager(runTable, maxTables, pacing, resumeGrace, log, seed)
+    finished = asyncio.Event()
+    if tournament is not None:
+        manager.tournament = Tournament(tournament, lambda entry: startTournamentTable(manager, entry),
+                                        lambda champion: endTournament(manager, champion, finished),
+                                        maxTables, lambda conn: conn.username, asyncio.get_running_loop().time)
+    asyncio.ensure_future(heartbeat(manager, heartbeatInterval, livenessTimeout))
+    handler = lambda reader, writer: handlePlayer(manager, reader, writer)
+    if sock is None:
+        server = await asyncio.start_server(handler, '', port, reuse_address=True, backlog=LISTEN_BACKLOG)
+    else:
+        server = await asyncio.start_server(handler, sock=sock)
+    print(f"Listening on port {port}")
+    if metricsPort is not None:
+        # read on the metrics thread, so they copy the table list first and
+        # only look at each table's published view
+        PLAYERS.set_function(lambda: sum(table.view.players for table in list(manager.tables.values())))
+        TABLES.set_function(lambda: len(manager.tables))
+        SPECTATORS.set_function(lambda: sum(len(table.spectators) for table in list(manager.tables.values())))
+        ACCEPT_QUEUE.set_function(lambda: accept_queue_depth(server.sockets[0]))
+        serve(metricsPort)
+    try:
+        async with server:
+            if tournament is not None:
+                await finished.wait()
+            else:
+                await server.serve_forever()
+    finally:
+        for table in list(manager.tables.values()):
+            for conn in table.playerConnections.values():
+                conn.close()
+            for conn in table.spectators:
+                conn.close()
+        if log is not None:
+            log.close()
+
+def runWorker(workerId, sock, port, maxTables, pacing, eventLog, metricsPort, seed, *heartbeatArgs):
+    if sock is None:
+        sock = listen_socket(port, LISTEN_BACKLOG, reusePort=True)
+    if eventLog is not None:
+        eventLog = f"{eventLog}.{workerId}"   # one log per worker process
+    if metricsPort is not None:
+        metricsPort += workerId               # and one metrics port
+    if seed is not None:
+        seed = f"{seed}.{workerId}"
+    print(f"Worker {workerId} started")
+    try:
+        asyncio.run(main(port, maxTables, pacing, sock, *heartbeatArgs, eventLog=eventLog, metricsPort=metricsPort,
+                         seed=seed))
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("port", type=int)
+    parser.add_argument("--max-tables", type=int, help="per worker")
+    parser.add_argument("--pacing", choices=PROFILES, default="normal")
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--decision-timeout", type=float, help="seconds a player has to keep or switch")
+    parser.add_argument("--heartbeat", type=float, default=HEARTBEAT_INTERVAL, help="seconds between PINGs")
+    parser.add_argument("--liveness-timeout", type=float, default=LIVENESS_TIMEOUT, help="seconds of silence before a player counts as gone")
+    parser.add_argument("--resume-grace", type=float, default=RESUME_GRACE, help="seconds a dropped player's seat is held")
+    parser.add_argument("--event-log", help="record every game to this file (PATH.N per worker with --workers)")
+    parser.add_argument("--metrics-port", type=int, help="serve Prometheus metrics at /metrics (PORT+N per worker with --workers)")
+    parser.add_argument("--seed", type=int, help="seed the tables' decks, for a reproducible run")
+    parser.add_argument("--tournament", type=int, metavar="PLAYERS",
+                        help="play one knockout tournament once this many players have registered, then exit")
+    args = parser.parse_args()
+    if args.tournament is not None and args.workers > 1:
+        parser.error("--tournament needs a single worker")
+    if args.tournament is not None and args.tournament < 2:
+        parser.error("--tournament needs at least 2 players")
+    pacing = PROFILES[args.pacing]
+    if args.decision_timeout is not None:
+        pacing = pacing.with_decision_timeout(args.decision_timeout)
+    heartbeatArgs = (args.heartbeat, args.liveness_timeout, args.resume_grace)
+    if args.workers > 1:
+        supervise(args.workers, runWorker, args.port, LISTEN_BACKLOG, args.port, args.max_tables, pacing,
+                  args.event_log, args.metrics_port, args.seed, *heartbeatArgs)
+    else:
+        try:
+            asyncio.run(main(args.port, args.max_tables, pacing, None, *heartbeatArgs,
+                             eventLog=args.event_log, metricsPort=args.metrics_port, seed=args.seed,
+                             tournament=args.tournament))
+        except KeyboardInterrupt:
+            print("\n[Shutting down]")
+        except Exception as e:
+            traceback.print_exc()
@@ -0,0 +1,199 @@
+import argparse
+import time
+import numpy as np
+from cards import KING, RANK
+
+# Batched statistics for rounds and whole games with NumPy. N games are
+# played at once as integer arrays instead of one by one through engine.py:
+# decks are rows of ranks (A=1 .. K=13, suits never matter to the rules),
+# cards are dealt from the front of each row, and a keep/switch policy is a
+# boolean table switch[seat, rank].
+#
+# In evaluate_rounds seats are positions in the flip order: position 0 acts
+# first and the last position is the dealer. In evaluate_games they are
+# table seats, with seat 0 dealing first like engine.new_game.
+#
+# Needs numpy (pip install numpy).
+
+LIVES = 4
+RANKS = np.array(RANK, dtype=np.int8)  # card 0..51 -> rank, see cards.py
+
+def shuffled_decks(n, rng, cards=52):
+    # n shuffled decks, only the first `cards` positions of each are
+    # shuffled (a partial Fisher-Yates, one vectorized swap per position)
+    decks = np.tile(RANKS, (n, 1))
+    rows = np.arange(n)
+    for i in range(cards):
+        j = rng.integers(i, 52, n)
+        picked = decks[rows, j]
+        decks[rows, j] = decks[rows, i]
+        decks[rows, i] = picked
+    return decks
+
+def threshold_policy(players, threshold):
+    # switch anything at or below `threshold` (e.g. 6 = switch A-6)
+    switch = np.zeros((players, 14), dtype=bool)
+    switch[:, 1:threshold + 1] = True
+    return switch
+
+def evaluate_rounds(decks, switch):
+    # One round per deck with every seat alive.
+    # -> (dealt ranks, final ranks, losers), each shaped (n, players)
+    players = switch.shape[0]
+    hands = decks[:, :players].astype(np.int8)
+    dealt = hands.copy()
+
+    for k in range(players - 1):
+        cur = hands[:, k].copy()
+        nxt = hands[:, k + 1].copy()
+        swap = switch[k, cur] & (cur != KING) & (nxt != KING)
+        hands[swap, k] = nxt[swap]
+        hands[swap, k + 1] = cur[swap]
+
+    # the dealer draws the next card from the deck instead
+    dealer = hands[:, -1]
+    draw = switch[players - 1, dealer] & (dealer != KING)
+    hands[:, -1] = np.where(draw, decks[:, players], dealer)
+
+    low = hands.min(axis=1)
+    losers = hands == low[:, None]
+    return dealt, hands, losers
+
+def round_stats(n, players, switch, rng):
+    decks = shuffled_decks(n, rng, cards=players + 1)
+    dealt, hands, losers = evaluate_rounds(decks, switch)
+    by_seat = losers.mean(axis=0)
+    by_rank = np.zeros((players, 14))
+    for k in range(players):
+        dealt_count = np.bincount(dealt[:, k], minlength=14)
+        lost_count = np.bincount(dealt[:, k], weights=losers[:, k], minlength=14)
+        by_rank[k] = lost_count / np.maximum(dealt_count, 1)
+    return by_seat, by_rank
+
+def next_alive(dealer, alive):
+    # engine.new_dealer for every game: first living seat after the dealer
+    players = alive.shape[1]
+    seats = (dealer[:, None] + np.arange(1, players + 1)) % players
+    first = np.argmax(alive[np.arange(len(dealer))[:, None], seats], axis=1)
+    return seats[np.arange(len(dealer)), first]
+
+def evaluate_games(n, switch, rng, max_rounds=100000):
+    # Plays n whole games of runGame.
+    # -> (rounds per game, reshuffles per game, winning seat)
+    players = switch.shape[0]
+    decks = shuffled_decks(n, rng)
+    cursor = np.zeros(n, dtype=np.int64)     # next card to deal
+    lives = np.full((n, players), LIVES, dtype=np.int8)
+    dealer = np.zeros(n, dtype=np.int64)
+    rounds = np.zeros(n, dtype=np.int64)
+    reshuffles = np.zeros(n, dtype=np.int64)
+    active = np.ones(n, dtype=bool)
+    positions = np.arange(players)
+
+    for _ in range(max_rounds):
+        g = np.flatnonzero(active)
+        if len(g) == 0:
+            break
+        m = len(g)
+        rows = np.arange(m)
+        glives = lives[g]
+        gdealer = dealer[g]
+        gcursor = cursor[g]
+        alive = glives > 0
+
+        # new dealer / new deck, same order of checks as runGame
+        low_deck = 52 - gcursor < players + 1
+        rotate = (glives[rows, gdealer] == 0) | low_deck
+        if low_deck.any():
+            fresh = g[low_deck]
+            decks[fresh] = shuffled_decks(len(fresh), rng)
+            gcursor[low_deck] = 0
+            reshuffles[fresh] += 1
+        if rotate.any():
+            gdealer[rotate] = next_alive(gdealer[rotate], alive[rotate])
+
+        # flip order: living seats starting after the dealer, dealer last
+        offsets = (positions - gdealer[:, None] - 1) % players
+        order = np.argsort(np.where(alive, offsets, players + offsets), axis=1)
+        count = alive.sum(axis=1)
+        valid = positions < count[:, None]
+
+        # deal, unused positions get a rank no real card can lose to
+        dealt_at = np.minimum(gcursor[:, None] + positions, 51)
+        hands = np.where(valid, decks[g[:, None], dealt_at], KING + 1).astype(np.int8)
+        gcursor += count
+
+        last = count - 1
+        for k in range(players - 1):
+            cur = hands[:, k].copy()
+            nxt = hands[:, k + 1].copy()
+            seat = order[:, k]
+            swap = (k < last) & switch[seat, np.minimum(cur, KING)] & (cur != KING) & (nxt != KING)
+            hands[swap, k] = nxt[swap]
+            hands[swap, k + 1] = cur[swap]
+
+        dealer_rank = hands[rows, last]
+        draw = switch[order[rows, last], dealer_rank] & (dealer_rank != KING)
+        drawn = decks[g, np.minimum(gcursor, 51)]
+        hands[rows, last] = np.where(draw, drawn, dealer_rank)
+        gcursor += draw
+
+        low = hands.min(axis=1)
+        lose = np.zeros((m, players), dtype=np.int8)
+        lose[rows[:, None], order] = (hands == low[:, None]) & valid
+        glives -= lose
+        left = (glives > 0).sum(axis=1)
+        # nobody left alive: a tie, everyone keeps their life
+        tie = left == 0
+        glives[tie] += lose[tie]
+        left[tie] = (glives[tie] > 0).sum(axis=1)
+
+        lives[g] = glives
+        dealer[g] = gdealer
+        cursor[g] = gcursor
+        rounds[g] += 1
+        active[g[left == 1]] = False
+
+    winners = np.argmax(lives > 0, axis=1)
+    return rounds, reshuffles, winners
+
+def print_rounds(n, players, threshold, rng):
+    switch = threshold_policy(players, threshold)
+    start = time.perf_counter()
+    by_seat, by_rank = round_stats(n, players, switch, rng)
+    elapsed = time.perf_counter() - start
+    print(f"{n} rounds, {players} players, switch <= {threshold}: "
+          f"{n / elapsed:,.0f} rounds/s")
+    print("loss probability by flip position (last = dealer):")
+    print("  " + "  ".join(f"{p:.3f}" for p in by_seat))
+    print("loss probability by dealt rank (rows = flip position):")
+    for k in range(players):
+        print("  " + " ".join(f"{p:.2f}" for p in by_rank[k, 1:]))
+
+def print_games(n, players, threshold, rng):
+    switch = threshold_policy(players, threshold)
+    start = time.perf_counter()
+    rounds, reshuffles, winners = evaluate_games(n, switch, rng)
+    elapsed = time.perf_counter() - start
+    print(f"{n} games, {players} players, switch <= {threshold}: "
+          f"{n / elapsed:,.0f} games/s, {rounds.sum() / elapsed:,.0f} rounds/s")
+    print(f"rounds per game: mean {rounds.mean():.1f}, "
+          f"p50 {np.percentile(rounds, 50):.0f}, p90 {np.percentile(rounds, 90):.0f}, max {rounds.max()}")
+    print(f"reshuffles per game: mean {reshuffles.mean():.2f}, "
+          f"per round {reshuffles.sum() / rounds.sum():.3f}")
+    print("wins by seat: " + "  ".join(f"{p:.3f}" for p in np.bincount(winners, minlength=players) / n))
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rounds", type=int, default=1000000)
+    parser.add_argument("--games", type=int, default=100000)
+    parser.add_argument("--players", type=int, default=6)
+    parser.add_argument("--threshold", type=int, default=6)
+    parser.add_argument("--seed", type=int)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    if args.rounds:
+        print_rounds(args.rounds, args.players, args.threshold, rng)
+    if args.games:
+        print_games(args.games, args.players, args.threshold, rng)
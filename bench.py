@@ -0,0 +1,363 @@
+import os
+import sys
+import json
+import time
+import timeit
+import functools
+import asyncio
+import argparse
+import platform
+import contextlib
+import subprocess
+from socket import *
+from game import *
+from engine import *
+from protocol import *
+from client import *
+from pacing import *
+from tables import Table
+from metrics import ROUNDS
+import async_server
+import bot
+
+# Benchmarks for the game logic, the wire protocol, a whole server game and
+# real rounds over loopback, so a slowdown in server.py, async_server.py or
+# the client code player.py runs on shows up as a number:
+#
+#   python3 bench.py                      run everything, compare to the baseline
+#   python3 bench.py --save-baseline      ... and make this run the new baseline
+#   python3 bench.py --groups game,codec  only some groups (see GROUPS)
+#   python3 bench.py --json results.json  also write the results as JSON
+#
+# Every result is a rate (higher is better) named group.benchmark. A result
+# more than --tolerance below its baseline value counts as a regression and
+# makes the run exit with status 1. Baselines only mean something on the
+# machine that made them.
+#
+# Groups:
+#   game      get_losing_seats, Deck.shuffle, generate_flip_order,
+#             new_dealer, create_list_string (calls/s)
+#   codec     encode and decode of every message type, framed and text
+#   client    decoding one player's messages from a whole game and handing
+#             them to a client.py handler, as player.py does (messages/s)
+#   runGame   async_server.runGame for whole games with in-memory
+#             connections answering every decision at once (games/s, rounds/s)
+#   loopback  2-6 bot.py bots against each server in turbo pacing, rated by
+#             the median round from DEAL to LOSERS (rounds/s), which unlike
+#             rounds per wall second doesn't depend on when games start
+
+BASELINE = "bench_baseline.json"
+TOLERANCE = 0.2         # fraction of a baseline value a result may drop by
+REPEAT = 10             # timings of each case, the fastest one counts
+SAMPLE_SECONDS = 0.03   # rough length of one timing
+RUNGAME_GAMES = 10      # games per runGame call
+LOOPBACK_SECONDS = 3.0
+SERVERS = ("async_server", "server")
+
+NAMES6 = ["alice", "bob", "carol", "dave", "eve", "frank"]
+
+# The timed groups give (name, func, scale) cases: the result is scale times
+# func's calls per second. Cases are timed round-robin, REPEAT rounds of
+# every case, so a slow spell on the machine hits all of them once instead
+# of one case every time, and each keeps its fastest timing.
+
+def calibrate(func):
+    # calls of func that take about SAMPLE_SECONDS
+    number = 1
+    while True:
+        elapsed = timeit.timeit(func, number=number)
+        if elapsed >= SAMPLE_SECONDS:
+            return number
+        number *= 2 if elapsed * 4 >= SAMPLE_SECONDS else 10
+
+def measure(cases, repeat):
+    numbers = [calibrate(func) for name, func, scale in cases]
+    best = [float("inf")] * len(cases)
+    for round in range(repeat):
+        for i, (name, func, scale) in enumerate(cases):
+            best[i] = min(best[i], timeit.timeit(func, number=numbers[i]))
+    return {name: scale * number / elapsed
+            for (name, func, scale), number, elapsed in zip(cases, numbers, best)}
+
+def six_player_state():
+    state = GameState()
+    for name in NAMES6:
+        addPlayer(state, name)
+    state.dealer = 0
+    return state
+
+def game_cases():
+    state = six_player_state()
+    hands = {seat: [card] for seat, card in enumerate((4, 17, 30, 43, 8, 21))}
+    hands[0].append(13)
+    deck = Deck(1)
+    flip_order = generate_flip_order(state)
+    return [
+        ("get_losing_seats", lambda: get_losing_seats(hands), 1),
+        ("deck_shuffle", deck.shuffle, 1),
+        ("generate_flip_order", lambda: generate_flip_order(state), 1),
+        ("new_dealer", lambda: new_dealer(state), 1),
+        ("create_list_string", lambda: create_list_string(flip_order), 1),
+    ]
+
+def sample_messages():
+    # message type -> fields of a typical message, for every type there is
+    table = {seat: [name, 4, seat == 0] for seat, name in enumerate(NAMES6)}
+    hands = {seat: [card] for seat, card in enumerate((4, 17, 30, 43, 8, 21))}
+    samples = {
+        "REJECTED": ("TABLE_FULL",),
+        "WAITING": ("Game will begin in 05",),
+        "TABLE": (json.dumps(table),),
+        "DEAL": ("1,2,3,4,5,0", "7♥"),
+        "FLIP_CARD": (3, "K♠"),
+        "PLAYER_ACTION": (2, "switch"),
+        "DECISION": ("7♥",),
+        "NEW_CARD": ("9♦",),
+        "REVEAL": ("1,2,3,4,5,0", json.dumps(hand_strs(hands))),
+        "LOSERS": ("bob,eve", "A♣,A♦"),
+        "PING": (),
+        "ACTION": ("switch",),
+        "ACK": (),
+        "DEADLINE": (20.0,),
+        "SNAPSHOT": (12, json.dumps(table)),
+        "TABLE_DELTA": (13, json.dumps({2: ["carol", 3, False], 4: None})),
+        "RESYNC": (),
+        "PONG": (),
+        "RESUME_TOKEN": ("0123456789abcdef0123456789abcdef",),
+    }
+    return [(msgType, samples[msgType]) for msgType, _ in MESSAGE_TYPES]
+
+def decode_text(data):
+    line, _, payload = data.partition(b"\n")
+    msgType, fields, size = split_text(line.decode())
+    if size:
+        fields.append(payload[:size].decode())
+    return msgType, fields
+
+def codec_cases():
+    cases = []
+    for msgType, fields in sample_messages():
+        framed = encode(FRAMED, msgType, *fields)
+        code, size = FRAME_HEADER.unpack_from(framed)
+        payload = framed[FRAME_HEADER.size:]
+        text = encode(TEXT, msgType, *fields)
+        cases += [
+            (f"encode.framed.{msgType}", functools.partial(encode, FRAMED, msgType, *fields), 1),
+            (f"decode.framed.{msgType}", functools.partial(decode_frame, code, payload), 1),
+            (f"encode.text.{msgType}", functools.partial(encode, TEXT, msgType, *fields), 1),
+            (f"decode.text.{msgType}", functools.partial(decode_text, text), 1),
+        ]
+    return cases
+
+class BenchConn(async_server.PlayerConn):
+    # A player connection with no socket: answers each DECISION right away
+    # and keeps what it is sent if `capture` is a bytearray
+    def __init__(self, policy, version=FRAMED, capture=None):
+        super().__init__(None, None)
+        self.version = version
+        self.policy = policy
+        self.capture = capture
+
+    def write(self, data):
+        if self.capture is not None:
+            self.capture += data
+        self.acked.set()    # caught up at once, see pacing.py acks
+
+    def message(self, msgType, *fields):
+        super().message(msgType, *fields)
+        if msgType == "DECISION":
+            self.lines.put_nowait(self.policy(fields[0]))
+
+def bench_table(gameNumber, capture=None):
+    table = Table(0)
+    table.pacing = TURBO
+    table.deck = Deck(f"bench:{gameNumber}")   # the same games every time
+    policy = bot.make_policy("threshold:6")
+    for name in NAMES6:
+        seat = addPlayer(table, name)
+        table.playerConnections[seat] = BenchConn(policy, capture=capture if seat == 0 else None)
+    table.dealer = 0
+    table.gameRunning = True
+    return table
+
+async def run_games():
+    for gameNumber in range(RUNGAME_GAMES):
+        await async_server.runGame(bench_table(gameNumber))
+
+def rungame_cases():
+    loop = asyncio.new_event_loop()
+    play = lambda: loop.run_until_complete(run_games())
+    rounds = ROUNDS.values.get(None, 0)
+    play()
+    rounds = ROUNDS.values.get(None, 0) - rounds
+    return [("games", play, RUNGAME_GAMES), ("rounds", play, rounds)]
+
+async def capture_game():
+    capture = bytearray()
+    await async_server.runGame(bench_table(0, capture))
+    return bytes(capture)
+
+class Headless(TableTracker):
+    def on_decision(self, card):
+        return "keep"
+
+def read_frames(data):
+    # -> [(msgType, fields)] of a captured framed stream
+    messages = []
+    pos = 0
+    while pos < len(data):
+        code, size = FRAME_HEADER.unpack_from(data, pos)
+        pos += FRAME_HEADER.size
+        messages.append(decode_frame(code, data[pos:pos + size]))
+        pos += size
+    return messages
+
+def client_cases():
+    data = asyncio.run(capture_game())
+
+    def play():
+        handler = Headless()
+        for msgType, fields in read_frames(data):
+            reply(msgType, dispatch(handler, msgType, fields))
+
+    return [("messages", play, len(read_frames(data)))]
+
+def quiet():
+    # the servers print every round
+    return contextlib.redirect_stdout(open(os.devnull, "w"))
+
+def free_port():
+    sock = socket(AF_INET, SOCK_STREAM)
+    sock.bind(('', 0))
+    port = sock.getsockname()[1]
+    sock.close()
+    return port
+
+def start_server(name, port):
+    proc = subprocess.Popen([sys.executable, f"{name}.py", str(port), "--pacing", "turbo", "--seed", "1"],
+                            cwd=os.path.dirname(os.path.abspath(__file__)),
+                            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    deadline = time.time() + 10
+    while time.time() < deadline:
+        try:
+            create_connection(("127.0.0.1", port), timeout=1).close()
+            return proc
+        except OSError:
+            time.sleep(0.05)
+    proc.kill()
+    raise RuntimeError(f"{name}.py did not start listening on port {port}")
+
+async def play_bots(port, count, seconds):
+    # -> rounds per second at the pace of the median round over `seconds`
+    stats = bot.Stats()
+    policy = bot.make_policy("threshold:6")
+    tasks = [asyncio.create_task(bot.run_bot("127.0.0.1", port, f"bot{i}", bot.Bot(stats, policy)))
+             for i in range(count)]
+    await asyncio.sleep(seconds)
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+    if not stats.roundTimes:
+        raise RuntimeError(f"{count} bots played no rounds in {seconds}s")
+    return 1 / bot.percentile(stats.roundTimes, 50)
+
+def bench_loopback(quick):
+    seconds = LOOPBACK_SECONDS / 3 if quick else LOOPBACK_SECONDS
+    results = {}
+    for name in SERVERS:
+        for count in range(2, 7):
+            port = free_port()
+            proc = start_server(name, port)
+            try:
+                results[f"{name}.{count}_bots"] = asyncio.run(play_bots(port, count, seconds))
+            finally:
+                proc.kill()
+                proc.wait()
+    return results
+
+TIMED = {
+    "game": game_cases,
+    "codec": codec_cases,
+    "client": client_cases,
+    "runGame": rungame_cases,
+}
+GROUPS = list(TIMED) + ["loopback"]
+
+def run(groups, quick):
+    repeat = 2 if quick else REPEAT
+    results = {}
+    with quiet():
+        cases = [(f"{group}.{name}", func, scale)
+                 for group in groups if group in TIMED
+                 for name, func, scale in TIMED[group]()]
+        if cases:
+            start = time.perf_counter()
+            results.update(measure(cases, repeat))
+            print(f"{len(cases)} timed cases: {time.perf_counter() - start:.1f}s", file=sys.stderr)
+    if "loopback" in groups:
+        start = time.perf_counter()
+        for name, value in bench_loopback(quick).items():
+            results[f"loopback.{name}"] = value
+        print(f"loopback: {time.perf_counter() - start:.1f}s", file=sys.stderr)
+    return results
+
+def compare(results, baseline, tolerance):
+    # Prints every result next to its baseline. -> names of the regressions
+    regressions = []
+    width = max(map(len, results))
+    for name, value in results.items():
+        old = baseline.get(name)
+        if old is None:
+            print(f"{name:<{width}}  {value:>14,.1f}")
+            continue
+        change = value / old - 1
+        flag = ""
+        if change < -tolerance:
+            flag = "  REGRESSION"
+            regressions.append(name)
+        elif change > tolerance:
+            flag = "  faster"
+        print(f"{name:<{width}}  {value:>14,.1f}  {old:>14,.1f}  {change:+7.1%}{flag}")
+    return regressions
+
+def document(results, quick):
+    return {
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "quick": quick,
+        "results": results,
+    }
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--groups", default=",".join(GROUPS), help=f"comma separated, of {', '.join(GROUPS)}")
+    parser.add_argument("--quick", action="store_true", help="fewer repeats and shorter runs, noisier numbers")
+    parser.add_argument("--json", help="write the results to this file")
+    parser.add_argument("--baseline", default=BASELINE, help="results to compare against")
+    parser.add_argument("--save-baseline", action="store_true", help="write this run to --baseline afterwards")
+    parser.add_argument("--tolerance", type=float, default=TOLERANCE, help="slowdown that counts as a regression, e.g. 0.2")
+    args = parser.parse_args()
+
+    groups = args.groups.split(",")
+    for group in groups:
+        if group not in GROUPS:
+            parser.error(f"unknown group {group}")
+
+    results = run(groups, args.quick)
+    baseline = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            baseline = json.load(f)["results"]
+    regressions = compare(results, baseline, args.tolerance)
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(document(results, args.quick), f, indent=2)
+    if args.save_baseline:
+        with open(args.baseline, "w") as f:
+            json.dump(document(results, args.quick), f, indent=2)
+        print(f"saved baseline to {args.baseline}")
+    if regressions:
+        print(f"{len(regressions)} regressions beyond {args.tolerance:.0%}: {', '.join(regressions)}")
+        sys.exit(1)
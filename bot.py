@@ -0,0 +1,225 @@
+import asyncio
+import argparse
+import random
+import time
+from client import *
+from cards import *
+
+# Headless players for load testing. Each Bot is a client.py handler that
+# answers decisions from a policy after a random think time, so thousands of
+# them fit in one process on one event loop.
+#
+# Policies:
+#   keep          always keep
+#   switch        always switch
+#   random        coin flip
+#   threshold:N   switch anything ranked N or lower (A=1 .. K=13)
+
+def make_policy(name):
+    if name == "keep":
+        return lambda card: "keep"
+    elif name == "switch":
+        return lambda card: "switch"
+    elif name == "random":
+        return lambda card: random.choice(("keep", "switch"))
+    elif name.startswith("threshold:"):
+        threshold = int(name.split(":")[1])
+        return lambda card: "switch" if RANK[parse_card(card)] <= threshold else "keep"
+    raise ValueError(f"unknown policy {name}")
+
+def percentile(values, p):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p / 100))]
+
+class Stats:
+    # shared by every bot of a load run
+    def __init__(self):
+        self.connected = 0
+        self.connectTimes = []   # seconds from connect() to HELLO reply
+        self.lastConnect = 0.0   # perf_counter() of the latest HELLO reply
+        self.roundTimes = []     # seconds from DEAL to LOSERS
+        self.rounds = 0
+        self.games = 0
+        self.watching = 0
+        self.watched = 0         # messages received by all watchers
+        self.errors = {}         # kind -> count
+
+    def error(self, kind):
+        self.errors[kind] = self.errors.get(kind, 0) + 1
+
+class Bot(TableTracker):
+    def __init__(self, stats, policy, think=(0, 0), games=None):
+        self.stats = stats
+        self.policy = policy
+        self.think = think
+        self.games = games       # leave after this many games, None = never
+        self.gamesPlayed = 0
+        self.roundStart = None
+        self.done = False
+
+    def on_rejected(self, reason):
+        self.stats.error("rejected")
+        self.done = True
+
+    def on_waiting(self, message):
+        if message.startswith("Gamer Over"):
+            self.stats.games += 1
+            self.gamesPlayed += 1
+            if self.games is not None and self.gamesPlayed >= self.games:
+                self.done = True
+        elif message.startswith("Player disconnected"):
+            self.stats.error("aborted game")
+        elif message.startswith(("Knocked out", "Tournament over")):
+            self.done = True
+
+    def on_deal(self, flip_order, card):
+        self.roundStart = time.perf_counter()
+
+    async def on_decision(self, card):
+        delay = random.uniform(*self.think)
+        if delay:
+            await asyncio.sleep(delay)
+        return self.policy(card)
+
+    def on_losers(self, usernames, cards):
+        if self.roundStart is not None:
+            self.stats.roundTimes.append(time.perf_counter() - self.roundStart)
+            self.stats.rounds += 1
+            self.roundStart = None
+
+class Watcher(TableTracker):
+    # a spectator that only counts what it is sent
+    def __init__(self, stats):
+        self.stats = stats
+        self.done = False
+
+    def on_rejected(self, reason):
+        # TABLE_CLOSED is the watched table ending, not an error
+        if reason != "TABLE_CLOSED":
+            self.stats.error(f"watch rejected {reason}")
+        self.done = True
+
+    def on_snapshot(self, seq, seats):
+        self.stats.watched += 1
+        return super().on_snapshot(seq, seats)
+
+    def on_table_delta(self, seq, seats):
+        self.stats.watched += 1
+        result = super().on_table_delta(seq, seats)
+        if result == RESYNC:
+            self.stats.error("watch resync")
+        return result
+
+    def on_waiting(self, message):
+        self.stats.watched += 1
+
+    def on_deal(self, flip_order, card):
+        self.stats.watched += 1
+
+    def on_flip_card(self, seat, card):
+        self.stats.watched += 1
+
+    def on_player_action(self, seat, action):
+        self.stats.watched += 1
+
+    def on_reveal(self, flip_order, player_cards):
+        self.stats.watched += 1
+
+    def on_losers(self, usernames, cards):
+        self.stats.watched += 1
+
+async def watch(serverIP, serverPort, watcher):
+    stats = watcher.stats
+    try:
+        reader, writer, version = await connect_async(serverIP, serverPort, None, watch=True)
+    except (OSError, ValueError) as e:
+        stats.error(type(e).__name__)
+        return
+    stats.watching += 1
+    try:
+        await run_client_async(reader, writer, version, watcher)
+    except (OSError, ValueError, IndexError) as e:
+        stats.error(type(e).__name__)
+    finally:
+        writer.close()
+
+async def run_bot(serverIP, serverPort, username, bot):
+    stats = bot.stats
+    start = time.perf_counter()
+    try:
+        reader, writer, version = await connect_async(serverIP, serverPort, username)
+    except (OSError, ValueError) as e:
+        stats.error(type(e).__name__)
+        return
+    stats.lastConnect = time.perf_counter()
+    stats.connectTimes.append(stats.lastConnect - start)
+    stats.connected += 1
+    try:
+        await run_client_async(reader, writer, version, bot)
+        if not bot.done:
+            stats.error("disconnected")
+    except (OSError, ValueError, IndexError) as e:
+        stats.error(type(e).__name__)
+    finally:
+        writer.close()
+
+async def load(args):
+    stats = Stats()
+    policy = make_policy(args.policy)
+    think = tuple(float(x) for x in args.think.split(","))
+    tasks = []
+    start = time.perf_counter()
+    for i in range(args.bots):
+        if args.rate:
+            # wait until this bot is due; if the loop is running behind,
+            # start it right away rather than drifting below the rate
+            delay = start + i / args.rate - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+        bot = Bot(stats, policy, think, args.games or None)
+        tasks.append(asyncio.create_task(run_bot(args.serverIP, args.serverPort, f"bot{i}", bot)))
+
+    # spectators of the busiest table, once the bots have filled some
+    watchers = [asyncio.create_task(watch(args.serverIP, args.serverPort, Watcher(stats)))
+                for i in range(args.watchers)]
+
+    # with --bots 0 this only watches, until --duration or the table closes
+    done, pending = await asyncio.wait(tasks or watchers, timeout=args.duration)
+    pending |= set(watchers)
+    for task in pending:
+        task.cancel()
+    await asyncio.gather(*pending, return_exceptions=True)
+    report(stats, args.bots, stats.lastConnect - start, time.perf_counter() - start)
+
+def report(stats, bots, connecting, elapsed):
+    if bots:
+        print(f"{stats.connected}/{bots} bots connected in {connecting:.2f}s "
+              f"({stats.connected / max(connecting, 1e-9):,.0f} connections/s)")
+        for name, times in (("connect", stats.connectTimes), ("round", stats.roundTimes)):
+            print(f"{name} latency ms: p50 {percentile(times, 50) * 1000:.1f}, "
+                  f"p90 {percentile(times, 90) * 1000:.1f}, p99 {percentile(times, 99) * 1000:.1f}")
+        print(f"{stats.rounds} rounds, {stats.games} games in {elapsed:.1f}s")
+    if stats.watching:
+        print(f"{stats.watching} watchers received {stats.watched:,} messages")
+    errors = ", ".join(f"{kind} {count}" for kind, count in sorted(stats.errors.items()))
+    print(f"errors: {errors or 'none'}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("serverIP")
+    parser.add_argument("serverPort", type=int)
+    parser.add_argument("--bots", type=int, default=60)
+    parser.add_argument("--rate", type=float, default=500, help="connections per second, 0 = all at once")
+    parser.add_argument("--policy", default="threshold:6")
+    parser.add_argument("--think", default="0,0", help="min,max seconds before each decision")
+    parser.add_argument("--games", type=int, default=1, help="games each bot plays before leaving, 0 = until sent away (tournaments)")
+    parser.add_argument("--watchers", type=int, default=0, help="spectators to attach to the busiest table")
+    parser.add_argument("--duration", type=float, help="stop after this many seconds")
+    args = parser.parse_args()
+
+    try:
+        asyncio.run(load(args))
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,26 @@
+# Cards are ints 0-51 everywhere inside the server, the engine and the
+# simulators; only the protocol sends them as strings like "10♥".
+# Card c has suit c // 13 and value c % 13 (A, 2, ..., K), the same order
+# the original create_shuffled_deck built its deck in (see game.Deck).
+
+VALUES = ['A'] + [str(n) for n in range(2, 11)] + ['J', 'Q', 'K']
+SUITS = ['♠', '♥', '♦', '♣']
+
+KING = 13
+DECK = tuple(range(52))
+
+RANK = tuple(card % 13 + 1 for card in DECK)    # card -> 1 (A) .. 13 (K)
+SUIT = tuple(card // 13 for card in DECK)       # card -> index into SUITS
+IS_KING = tuple(rank == KING for rank in RANK)
+NAMES = tuple(f"{VALUES[card % 13]}{SUITS[card // 13]}" for card in DECK)
+CODES = {name: card for card, name in enumerate(NAMES)}
+
+def card_str(card):
+    return NAMES[card]
+
+def parse_card(name):
+    return CODES[name]
+
+def hand_strs(hands):
+    # seat -> [card] to seat -> [card string], e.g. for REVEAL
+    return {seat: [NAMES[card] for card in cards] for seat, cards in hands.items()}
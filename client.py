@@ -0,0 +1,150 @@
+import json
+import asyncio
+import inspect
+import time
+from socket import *
+from netio import *
+from protocol import *
+
+# Client side of the protocol without any UI: connecting, parsing each
+# message into plain values and sending the replies the server expects.
+# player.py puts curses on top of it, bot.py plays headless.
+#
+# A handler is any object with on_<message>() methods, e.g. on_table(table)
+# or on_decision(card); messages it has no method for are ignored.
+# on_decision must return "keep" or "switch" and may be a coroutine when
+# used with run_client_async. Handlers that subclass TableTracker get
+# on_table(table) for framed connections too, rebuilt from SNAPSHOT and
+# TABLE_DELTA messages.
+
+RESYNC = "RESYNC"
+RESUME_TRIES = 10   # reconnect attempts, a second apart, after a drop
+
+def parse_list(message):
+    return [int(x) for x in message.split(",")]
+
+def seat_dict(data):
+    return {int(k): v for k, v in json.loads(data).items()}
+
+def parse_message(msgType, fields):
+    # -> handler arguments
+    if msgType == "TABLE":
+        return (seat_dict(fields[0]),)
+    elif msgType == "DEAL":
+        return (parse_list(fields[0]), fields[1])
+    elif msgType in ("FLIP_CARD", "PLAYER_ACTION"):
+        return (int(fields[0]), fields[1])
+    elif msgType == "REVEAL":
+        return (parse_list(fields[0]), seat_dict(fields[1]))
+    elif msgType == "LOSERS":
+        return (fields[0].split(","), fields[1].split(","))
+    elif msgType == "DEADLINE":
+        return (float(fields[0]),)
+    elif msgType in ("SNAPSHOT", "TABLE_DELTA"):
+        seats = {int(k): v for k, v in json.loads(fields[1]).items()}
+        return (int(fields[0]), seats)
+    return tuple(fields)
+
+def dispatch(handler, msgType, fields):
+    method = getattr(handler, "on_" + msgType.lower(), None)
+    if method is None:
+        return None
+    return method(*parse_message(msgType, fields))
+
+def reply(msgType, result):
+    # the message to send back after handling msgType, if any
+    if msgType == "DECISION":
+        return ("ACTION", result)
+    elif msgType == "REVEAL":
+        return ("ACK",)
+    elif msgType == "PING":
+        return ("PONG",)
+    elif result == RESYNC:
+        return ("RESYNC",)
+    return None
+
+class TableTracker:
+    # Keeps self.table up to date from SNAPSHOT/TABLE_DELTA and hands the
+    # whole table to on_table like a text TABLE message. A delta that skips
+    # a sequence number is dropped and a RESYNC requested; deltas are then
+    # ignored until the SNAPSHOT arrives.
+    table = None
+    tableSeq = None
+
+    def on_snapshot(self, seq, table):
+        self.table = table
+        self.tableSeq = seq
+        return self.on_table(dict(table))
+
+    def on_table_delta(self, seq, delta):
+        if self.tableSeq is None:
+            return None
+        if seq != self.tableSeq + 1:
+            self.tableSeq = None
+            return RESYNC
+        for seat, entry in delta.items():
+            if entry is None:
+                self.table.pop(seat, None)
+            else:
+                self.table[seat] = entry
+        self.tableSeq = seq
+        return self.on_table(dict(self.table))
+
+    def on_table(self, table):
+        pass
+
+def connect(serverIP, serverPort, username, token=None, watch=False, table=None):
+    # token: reclaim a seat with a RESUME_TOKEN instead of joining as username
+    # watch: join as a spectator of table (None = the busiest one)
+    conn = BufferedConn(socket(AF_INET, SOCK_STREAM))
+    conn.connect((serverIP, serverPort))
+    if watch:
+        conn.sendall(watch_hello(table))
+    else:
+        conn.sendall(hello(username) if token is None else resume_hello(token))
+    _, version = conn.getLine().split(":")
+    conn.version = int(version)
+    return conn
+
+def reconnect(serverIP, serverPort, token, tries=RESUME_TRIES):
+    # -> a resumed connection, or None if the server can't be reached
+    for attempt in range(tries):
+        try:
+            return connect(serverIP, serverPort, None, token)
+        except (OSError, ValueError):
+            time.sleep(1)
+    return None
+
+def run_client(conn, handler):
+    # Blocking message loop until the server closes or rejects us
+    while True:
+        msgType, fields = read_message(conn)
+        if msgType is None:
+            return
+        answer = reply(msgType, dispatch(handler, msgType, fields))
+        if answer:
+            send_message(conn, *answer)
+        if msgType == "REJECTED":
+            return
+
+async def connect_async(serverIP, serverPort, username, watch=False, table=None):
+    reader, writer = await asyncio.open_connection(serverIP, serverPort)
+    writer.write(watch_hello(table) if watch else hello(username))
+    _, version = (await reader.readline()).decode().split(":")
+    return reader, writer, int(version)
+
+async def run_client_async(reader, writer, version, handler):
+    # asyncio version of run_client; stops early once handler.done is set
+    while not getattr(handler, "done", False):
+        msgType, fields = await read_message_async(reader, version)
+        if msgType is None:
+            return
+        result = dispatch(handler, msgType, fields)
+        if inspect.isawaitable(result):
+            result = await result
+        answer = reply(msgType, result)
+        if answer:
+            writer.write(encode(version, *answer))
+            await writer.drain()
+        if msgType == "REJECTED":
+            return
@@ -0,0 +1,151 @@
+from game import *
+
+# The rules of a round and a whole game with no sockets, JSON or sleeps.
+#
+# round_events/game_events are generators that yield what happens as plain
+# tuples and, for ("decision", seat, card), expect "keep" or "switch" to be
+# sent back. The servers turn the events into protocol messages and pauses;
+# simulate_round/simulate_game just answer decisions from callbacks, so a
+# whole game runs in memory for rule testing and capacity modelling.
+# Cards are ints (see cards.py). Decks come from state.deck (game.Deck), so
+# a game is decided by its deck seed and the answers to its decisions.
+#
+# Events:
+#   ("table",)                          table lives/dealer changed
+#   ("new_deck",)                       deck was reshuffled
+#   ("pause", point)                    a pacing point, see pacing.py
+#   ("deal", order, flip_order, hands)  hands: seat -> [card]
+#   ("flip", seat, card)                a King is shown and can't be switched
+#   ("decision", seat, card)            ask the seat to keep or switch
+#   ("new_card", seat, card)            the seat's card after a switch
+#   ("action", seat, decision)
+#   ("reveal", flip_order, hands)
+#   ("losers", losing_seats, losing_cards)
+#   ("game_over", seat)                 the winner's seat, right before the end
+
+def round_events(deck, order, flip_order):
+    # order: every seated player (eliminated ones still get a DEAL)
+    hands = {}
+    for seat in flip_order:
+        hands[seat] = [deck.pop()]
+    yield ("deal", order, flip_order, hands)
+    yield ("pause", "deal")
+
+    last = len(flip_order) - 1
+    for i, seat in enumerate(flip_order):
+        card = hands[seat][0]
+        if IS_KING[card]:
+            yield ("flip", seat, card)
+        else:
+            decision = yield ("decision", seat, card)
+            if decision == "switch":
+                if i < last:
+                    # trade with the next player unless they hold a King
+                    next_seat = flip_order[i + 1]
+                    if not IS_KING[hands[next_seat][0]]:
+                        hands[seat], hands[next_seat] = hands[next_seat], hands[seat]
+                        yield ("new_card", seat, hands[seat][0])
+                        yield ("pause", "new_card")
+                else:
+                    # the dealer draws from the deck instead
+                    hands[seat].append(deck.pop())
+                    yield ("new_card", seat, hands[seat][-1])
+                    yield ("pause", "new_card")
+            yield ("action", seat, decision)
+        if i < last or len(flip_order) > 2:
+            yield ("pause", "turn")
+
+    yield ("pause", "decisions_done")
+    yield ("reveal", flip_order, hands)
+    return hands
+
+def apply_losses(state, losing_seats):
+    # Take a life from every loser. If that would leave nobody alive the
+    # round is a tie and the lives are given back.
+    # Returns 1 if the game goes on, 0 if one player is left, -1 on a tie.
+    for seat in losing_seats:
+        state.table[seat][1] -= 1
+
+    round_result = players_left(state)
+    if round_result == -1:
+        for seat in losing_seats:
+            state.table[seat][1] += 1
+    return round_result
+
+def game_events(state, new_deck=None):
+    # One game of runGame: returns the winner's username. new_deck() gives
+    # each fresh deck, state.deck.shuffle unless a caller wraps it.
+    if new_deck is None:
+        new_deck = state.deck.shuffle
+    yield ("table",)
+
+    order = generate_flip_order(state)
+    deck = new_deck()
+    while True:
+        if state.table[state.dealer][1] == 0:
+            new_dealer(state)
+
+            if len(deck) < (state.playerCount + 1):
+                deck = new_deck()
+                yield ("new_deck",)
+
+            yield ("table",)
+            yield ("pause", "table")
+
+        elif len(deck) < (state.playerCount + 1):
+            deck = new_deck()
+            yield ("new_deck",)
+            new_dealer(state)
+
+            yield ("table",)
+            yield ("pause", "table")
+
+        flip_order = generate_flip_order(state)
+        hands = yield from round_events(deck, order, flip_order)
+        yield ("pause", "reveal")
+
+        losing_seats = get_losing_seats(hands)
+        losing_cards = [hands[seat][-1] for seat in losing_seats]
+        result = apply_losses(state, losing_seats)
+        yield ("pause", "losers")
+        yield ("losers", losing_seats, losing_cards)
+        yield ("pause", "round_end")
+
+        if result == 0:
+            winner = generate_flip_order(state)[0]
+            yield ("game_over", winner)
+            return state.table[winner][0]
+
+        yield ("table",)
+        yield ("pause", "table")
+
+def drive(events, deciders):
+    # Run an event generator to the end, answering decisions with
+    # deciders[seat](card). Returns the generator's return value.
+    decision = None
+    try:
+        while True:
+            event = events.send(decision)
+            decision = deciders[event[1]](event[2]) if event[0] == "decision" else None
+    except StopIteration as done:
+        return done.value
+
+def simulate_round(deck, flip_order, deciders):
+    # -> (final hands, losing seats)
+    hands = drive(round_events(deck, flip_order, flip_order), deciders)
+    return hands, get_losing_seats(hands)
+
+def new_game(usernames, seed=None):
+    # seed: the table PRNG's seed, for a reproducible run of games
+    state = GameState()
+    state.deck = Deck(seed)
+    for username in usernames:
+        addPlayer(state, username)
+    state.dealer = 0
+    return state
+
+def simulate_game(state, deciders, seed=None):
+    # Plays state (e.g. from new_game) to the end, returns the winner.
+    # seed: this game's deck seed, as recorded by eventlog.py
+    state.deck.new_game(seed)
+    return drive(game_events(state), deciders)
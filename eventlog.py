@@ -0,0 +1,342 @@
+import os
+import sys
+import json
+import mmap
+import time
+import struct
+import threading
+from game import *
+
+# Append-only binary record of every game a server plays, and the tools
+# that read it back: `python3 eventlog.py stats LOG` for analytics over
+# the whole file, `python3 eventlog.py games LOG` to list the games, and
+# `python3 player.py --replay LOG GAME` to watch one again.
+#
+# The file is MAGIC followed by records:
+#   game id (8) | seconds since the game started (4) | kind (1) | payload length (1) | payload
+# A game's id is the file offset of its GAME_START record, so a replay can
+# start reading right there. Games from different tables interleave.
+# Seats and cards (0-51, see cards.py) are one byte each.
+#
+# Payloads:
+#   GAME_START  unix time (8), deck seed (8), table id (8), dealer, then per
+#               seat: seat, lives, name length, name (at most NAME_BYTES)
+#   SHUFFLE     empty: the game's next deck, game.Deck.new_game(seed)
+#               followed by one shuffle() per SHUFFLE gives the same cards
+#   DEAL        flip order, then each of those seats' card
+#   KING        seat, card: a King is shown and can't be switched
+#   DECISION    seat, card, switched, timed out, latency in seconds (float);
+#               written once the turn is over, switched is KEPT, SWITCHED,
+#               or KING_BLOCKED (asked to switch, but the next player's
+#               King stopped the trade)
+#   SWITCH      seat, the card they got (before their DECISION)
+#   REVEAL      per seat in flip order: seat, card count, cards
+#   LOSERS      losing seats
+#   LIVES       seat, lives left
+#   DEALER      seat
+#   GAME_END    winning seat
+#
+# Servers only append to an in-memory buffer; a writer thread writes and
+# fsyncs it every FSYNC_INTERVAL seconds, so a crash loses at most that
+# much and the game loop never waits on the disk. A record cut short by a
+# crash is ignored by the readers, and cut off when the log is next opened
+# for writing, so new records never land after it.
+
+MAGIC = b"SYNLOG\x00\x03"
+HEADER = struct.Struct("<QfBB")
+START_RECORD = struct.Struct("<dQQB")
+DECISION_RECORD = struct.Struct("<BBBBf")
+FSYNC_INTERVAL = 1.0
+KEPT, SWITCHED, KING_BLOCKED = range(3)     # DECISION's switched
+NAME_BYTES = 32
+
+KINDS = ["GAME_START", "SHUFFLE", "DEAL", "KING", "DECISION", "SWITCH",
+         "REVEAL", "LOSERS", "LIVES", "DEALER", "GAME_END"]
+(GAME_START, SHUFFLE, DEAL, KING, DECISION, SWITCH,
+ REVEAL, LOSERS, LIVES, DEALER, GAME_END) = range(len(KINDS))
+
+class EventLog:
+    def __init__(self, path, fsyncInterval=FSYNC_INTERVAL):
+        if os.path.exists(path):
+            os.truncate(path, records_end(path))
+        self.file = open(path, "ab")
+        if self.file.tell() == 0:
+            self.file.write(MAGIC)
+            self.file.flush()
+        self.size = self.file.tell()    # bytes in the file once pending is written
+        self.pending = bytearray()
+        self.lock = threading.Lock()        # guards pending and size
+        self.flushLock = threading.Lock()   # one write+fsync at a time, in order
+        self.interval = fsyncInterval
+        self.closed = threading.Event()
+        self.writer = threading.Thread(target=self.run, daemon=True)
+        self.writer.start()
+
+    def append(self, game, elapsed, kind, payload=b""):
+        # -> the record's offset in the file; game None starts a new game
+        # with this record as its id
+        with self.lock:
+            offset = self.size + len(self.pending)
+            if game is None:
+                game = offset
+            self.pending += HEADER.pack(game, elapsed, kind, len(payload))
+            self.pending += payload
+        return offset
+
+    def flush(self):
+        with self.flushLock:
+            with self.lock:
+                data, self.pending = self.pending, bytearray()
+                self.size += len(data)
+            if data:
+                self.file.write(data)
+                self.file.flush()
+                os.fsync(self.file.fileno())
+
+    def run(self):
+        while not self.closed.wait(self.interval):
+            self.flush()
+
+    def close(self):
+        self.closed.set()
+        self.writer.join()
+        self.flush()
+        self.file.close()
+
+class GameRecorder:
+    # Writes one game's engine events (see engine.py) to an EventLog. The
+    # server's runGame hands it every event, with the answer and how long
+    # it took for decisions, and deals from its new_deck.
+    def __init__(self, log, state):
+        self.log = log
+        self.state = state
+        self.timeouts = dict(state.timeouts)
+        self.lives = {seat: entry[1] for seat, entry in state.table.items()}
+        self.dealer = state.dealer
+        self.winner = None          # seat, from the engine's game_over event
+        self.decision = None        # [seat, card, switched, timed out, latency] of the turn being played
+        self.start = time.time()
+        payload = bytearray(START_RECORD.pack(self.start, state.deck.seed, getattr(state, "id", 0), state.dealer))
+        for seat, (username, lives, isDealer) in state.table.items():
+            # cut on a character boundary, or the name won't decode again
+            name = username.encode()[:NAME_BYTES].decode(errors="ignore").encode()
+            payload += bytes((seat, lives, len(name))) + name
+        self.game = log.append(None, 0.0, GAME_START, bytes(payload))
+
+    def append(self, kind, payload):
+        self.log.append(self.game, time.time() - self.start, kind, payload)
+
+    def new_deck(self):
+        self.append(SHUFFLE, b"")
+        return self.state.deck.shuffle()
+
+    def sync_table(self):
+        # LIVES/DEALER for whatever changed since the last sync
+        for seat, entry in self.state.table.items():
+            if self.lives.get(seat) != entry[1]:
+                self.lives[seat] = entry[1]
+                self.append(LIVES, bytes((seat, entry[1])))
+        if self.state.dealer != self.dealer:
+            self.dealer = self.state.dealer
+            self.append(DEALER, bytes((self.dealer,)))
+
+    def event(self, event, decision=None, latency=0.0):
+        kind = event[0]
+        if kind == "table":
+            self.sync_table()
+        elif kind == "deal":
+            _, order, flip_order, hands = event
+            self.append(DEAL, bytes(flip_order) + bytes(hands[seat][0] for seat in flip_order))
+        elif kind == "flip":
+            self.append(KING, bytes(event[1:3]))
+        elif kind == "decision":
+            seat = event[1]
+            timedOut = self.state.timeouts.get(seat, 0) > self.timeouts.get(seat, 0)
+            self.timeouts[seat] = self.state.timeouts.get(seat, 0)
+            # a switch only counts once a new_card shows it went through
+            self.decision = [seat, event[2], KING_BLOCKED if decision == "switch" else KEPT, timedOut, latency]
+        elif kind == "new_card":
+            self.append(SWITCH, bytes(event[1:3]))
+            self.decision[2] = SWITCHED
+        elif kind == "action":
+            self.append(DECISION, DECISION_RECORD.pack(*self.decision))
+            self.decision = None
+        elif kind == "reveal":
+            _, flip_order, hands = event
+            payload = bytearray()
+            for seat in flip_order:
+                payload += bytes((seat, len(hands[seat]))) + bytes(hands[seat])
+            self.append(REVEAL, bytes(payload))
+        elif kind == "losers":
+            self.append(LOSERS, bytes(event[1]))
+        elif kind == "game_over":
+            self.winner = event[1]
+
+    def end(self, winner):
+        # winner: the username runGame returns; the seat comes from the
+        # game_over event, as two players may share a name
+        self.sync_table()
+        self.append(GAME_END, bytes((self.winner,)))
+
+def records(path, start=None):
+    # Every complete record from offset start (default: the first) as
+    # (offset, game id, seconds into the game, kind, payload), read through mmap
+    with open(path, "rb") as f:
+        if os.fstat(f.fileno()).st_size < len(MAGIC):
+            return
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            if data[:len(MAGIC)] != MAGIC:
+                raise ValueError(f"{path} is not an event log")
+            unpack = HEADER.unpack_from
+            headerSize = HEADER.size
+            end = len(data)
+            pos = len(MAGIC) if start is None else start
+            while pos + headerSize <= end:
+                game, t, kind, length = unpack(data, pos)
+                body = pos + headerSize
+                if body + length > end:
+                    return
+                yield pos, game, t, kind, data[body:body + length]
+                pos = body + length
+
+def records_end(path):
+    # offset just past the last complete record, 0 if not even MAGIC made it
+    if os.path.getsize(path) < len(MAGIC):
+        return 0
+    end = len(MAGIC)
+    for offset, game, t, kind, payload in records(path):
+        end = offset + HEADER.size + len(payload)
+    return end
+
+def parse_start(payload):
+    # GAME_START payload -> (unix time, deck seed, table id, dealer, seat -> [username, lives])
+    start, seed, tableId, dealer = START_RECORD.unpack_from(payload)
+    seats = {}
+    pos = START_RECORD.size
+    while pos < len(payload):
+        seat, lives, size = payload[pos:pos + 3]
+        seats[seat] = [payload[pos + 3:pos + 3 + size].decode(), lives]
+        pos += 3 + size
+    return start, seed, tableId, dealer, seats
+
+def parse_reveal(payload):
+    # REVEAL payload -> (flip order, seat -> [card, ...])
+    order = []
+    hands = {}
+    pos = 0
+    while pos < len(payload):
+        seat, count = payload[pos:pos + 2]
+        order.append(seat)
+        hands[seat] = list(payload[pos + 2:pos + 2 + count])
+        pos += 2 + count
+    return order, hands
+
+def game_messages(path, game):
+    # One recorded game as (seconds into the game, msgType, fields) protocol messages, what a
+    # spectator would have been sent (see async_server.py). game is its id,
+    # or None for the first game in the file.
+    table = {}
+    hands = {}
+    for offset, recordGame, t, kind, payload in records(path, game):
+        if game is None and kind == GAME_START:
+            game = recordGame
+        if recordGame != game:
+            continue
+        if kind == GAME_START:
+            start, seed, tableId, dealer, seats = parse_start(payload)
+            table = {seat: [name, lives, seat == dealer] for seat, (name, lives) in seats.items()}
+            yield t, "TABLE", [json.dumps(table)]
+        elif kind == LIVES:
+            table[payload[0]][1] = payload[1]
+        elif kind == DEALER:
+            for seat, entry in table.items():
+                entry[2] = seat == payload[0]
+        elif kind == DEAL:
+            flip_order = list(payload[:len(payload) // 2])
+            yield t, "TABLE", [json.dumps(table)]
+            yield t, "DEAL", [create_list_string(flip_order), "NONE"]
+        elif kind == KING:
+            yield t, "FLIP_CARD", [payload[0], NAMES[payload[1]]]
+        elif kind == DECISION:
+            seat, card, switched, timedOut, latency = DECISION_RECORD.unpack(payload)
+            yield t, "PLAYER_ACTION", [seat, "switch" if switched else "keep"]
+        elif kind == REVEAL:
+            flip_order, hands = parse_reveal(payload)
+            yield t, "REVEAL", [create_list_string(flip_order), json.dumps(hand_strs(hands))]
+        elif kind == LOSERS:
+            yield t, "LOSERS", [create_list_string([table[seat][0] for seat in payload]),
+                                create_list_string([NAMES[hands[seat][-1]] for seat in payload])]
+        elif kind == GAME_END:
+            yield t, "TABLE", [json.dumps(table)]
+            yield t, "WAITING", [f"Gamer Over - {table[payload[0]][0]} wins"]
+            return
+
+def percentile(values, p):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p / 100))]
+
+def stats(paths):
+    start = time.perf_counter()
+    count = 0
+    kinds = [0] * len(KINDS)
+    names = {}                  # game id -> seat -> username
+    decisions = [0] * 14        # by rank
+    switches = [0] * 14
+    timeouts = 0
+    blocked = 0                 # switches a King stopped
+    latencies = {}              # username -> [seconds]
+    for path in paths:
+        for offset, game, t, kind, payload in records(path):
+            count += 1
+            kinds[kind] += 1
+            if kind == DECISION:
+                seat, card, switched, timedOut, latency = DECISION_RECORD.unpack(payload)
+                rank = RANK[card]
+                decisions[rank] += 1
+                switches[rank] += switched == SWITCHED
+                blocked += switched == KING_BLOCKED
+                timeouts += timedOut
+                latencies.setdefault(names[game][seat], []).append(latency)
+            elif kind == GAME_START:
+                names[game] = {seat: name for seat, (name, lives) in parse_start(payload)[4].items()}
+            elif kind == GAME_END:
+                del names[game]
+    elapsed = time.perf_counter() - start
+
+    print(f"{count:,} records in {elapsed:.2f}s ({count / max(elapsed, 1e-9):,.0f} records/s)")
+    print(f"{kinds[GAME_END]:,} games finished of {kinds[GAME_START]:,}, {kinds[DEAL]:,} rounds, "
+          f"{kinds[SHUFFLE]:,} shuffles")
+    total = sum(decisions)
+    print(f"{total:,} decisions, {sum(switches) / max(total, 1):.1%} switched, {blocked:,} switches stopped by a King, "
+          f"{timeouts:,} timed out, {kinds[KING]:,} Kings shown")
+    print("switch rate by rank: " + "  ".join(
+        f"{VALUES[rank - 1]} {switches[rank] / decisions[rank]:.0%}" for rank in range(1, 14) if decisions[rank]))
+    every = [latency for values in latencies.values() for latency in values]
+    print(f"decision latency ms: p50 {percentile(every, 50) * 1000:.0f}, "
+          f"p90 {percentile(every, 90) * 1000:.0f}, p99 {percentile(every, 99) * 1000:.0f}")
+    slowest = sorted(latencies.items(), key=lambda item: percentile(item[1], 90), reverse=True)[:5]
+    print("slowest players (p90 ms): " + ", ".join(
+        f"{name} {percentile(values, 90) * 1000:.0f} ({len(values)} decisions)" for name, values in slowest))
+
+def games(path):
+    started = {}
+    for offset, game, t, kind, payload in records(path):
+        if kind == GAME_START:
+            start, seed, tableId, dealer, seats = parse_start(payload)
+            started[game] = (start, seed, tableId, seats)
+        elif kind == GAME_END and game in started:
+            t, seed, tableId, seats = started.pop(game)
+            players = ", ".join(name for name, lives in seats.values())
+            print(f"{game:>12}  {time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(t))}  "
+                  f"table {tableId}  seed {seed:016x}  {players}  -> {seats[payload[0]][0]} won")
+
+if __name__ == "__main__":
+    if len(sys.argv) < 3 or sys.argv[1] not in ("stats", "games"):
+        print("usage: python3 eventlog.py stats LOG [LOG ...] | games LOG")
+        sys.exit(1)
+    if sys.argv[1] == "stats":
+        stats(sys.argv[2:])
+    else:
+        games(sys.argv[2])
@@ -0,0 +1,222 @@
+import random
+import json
+from pacing import *
+from lobby import *
+from cards import *
+from protocol import *
+
+class Seat(list):
+    # [username, lives, isDealer] that tells its table when it changes
+    __slots__ = ("owner",)
+
+    def __init__(self, owner, entry):
+        super().__init__(entry)
+        self.owner = owner
+
+    def __setitem__(self, index, value):
+        if self[index] != value:
+            super().__setitem__(index, value)
+            self.owner.changed()
+
+class SeatTable(dict):
+    # seat -> Seat. Every change bumps version and drops what was cached
+    # for the old contents, so an encoded table is built once per change
+    # however many times it is sent.
+    def __init__(self):
+        super().__init__()
+        self.version = 0
+        self.cache = {}
+
+    def changed(self):
+        self.version += 1
+        self.cache.clear()
+
+    def __setitem__(self, seat, entry):
+        super().__setitem__(seat, Seat(self, entry))
+        self.changed()
+
+    def __delitem__(self, seat):
+        super().__delitem__(seat)
+        self.changed()
+
+    def cached(self, key, build):
+        # build() the first time key is asked for since the last change
+        value = self.cache.get(key)
+        if value is None:
+            value = self.cache[key] = build()
+        return value
+
+class GameState:
+    def __init__(self):
+        self.table = SeatTable()   # seat -> [username, lives, isDealer]
+        self.playerConnections = {} # seat -> socket
+        self.playerCount = 0
+        self.gameRunning = False
+        self.lobby = Lobby()       # between games, see lobby.py
+        self.dealer = None
+        self.pacing = NORMAL
+        self.timeouts = {}         # seat -> decisions that ran out of time
+        self.tableSeq = 0          # version of the table clients were last sent
+        self.syncedTable = {}      # the table as of tableSeq, see table_delta
+        self.syncedVersion = 0     # table.version syncedTable was copied at
+        self.snapshot = None       # (tableSeq, encoded SNAPSHOT), see snapshot_frame
+        self.log = None            # eventlog.EventLog games are recorded to, if any
+        self.deck = Deck()
+        self.commands = None       # the owner's queue of joins/leaves, see the servers
+        self.view = TableView()    # published by the owner for everyone else
+
+class TableView:
+    # What other threads and tasks may look at (metrics, the accept path).
+    # Only a table's owner changes the table; after each change it puts a
+    # new TableView in state.view, so readers never lock and never see a
+    # half-made change.
+    __slots__ = ("players", "running")
+
+    def __init__(self, players=0, running=False):
+        self.players = players
+        self.running = running
+
+def update_view(state):
+    state.view = TableView(state.playerCount, state.gameRunning)
+
+def create_list_string(data):
+    # Flatten the list if it contains sublists
+    flattened_data = []
+    for item in data:
+        if isinstance(item, list):  # Check if the item is a list
+            flattened_data.extend(item)  # Add the sublist elements to the flattened list
+        else:
+            flattened_data.append(item)  # Otherwise, add the item itself
+
+    # Now join the flattened list
+    return ",".join(map(str, flattened_data))
+
+class Deck:
+    # A table's shoe: the 52 cards in one preallocated list, shuffled in
+    # place (Fisher-Yates) and dealt from the end by moving a cursor, so a
+    # reshuffle allocates nothing. The table has its own PRNG, which hands
+    # every game a 64-bit seed; the game's shuffles all come from a
+    # generator seeded with it, so new_game(seed) plays back the same decks.
+    def __init__(self, seed=None):
+        self.cards = list(DECK)
+        self.cursor = 0
+        self.seeds = random.Random(seed)    # table PRNG, one draw per game
+        self.rng = random.Random()          # this game's shuffles
+        self.seed = None
+        self.new_game()
+
+    def new_game(self, seed=None):
+        # -> the seed this game's decks come from
+        self.seed = self.seeds.getrandbits(64) if seed is None else seed
+        self.rng.seed(self.seed)
+        self.cards[:] = DECK
+        self.cursor = 0
+        return self.seed
+
+    def shuffle(self):
+        cards = self.cards
+        rnd = self.rng.random
+        for i in range(51, 0, -1):
+            j = int(rnd() * (i + 1))
+            cards[i], cards[j] = cards[j], cards[i]
+        self.cursor = 52
+        return self
+
+    def pop(self):
+        self.cursor -= 1
+        return self.cards[self.cursor]
+
+    def __len__(self):
+        # cards left to deal
+        return self.cursor
+
+def get_losing_seats(table):
+    # table: seat -> [card] or [card, drawn card]; the last card counts
+    min_rank = min(RANK[cards[-1]] for cards in table.values())
+    return [seat for seat, cards in table.items() if RANK[cards[-1]] == min_rank]
+
+def addPlayer(state, username):
+    if state.playerCount == 0:
+        state.table[0] = [username, 4, True]  # Seat 0 is dealer
+        state.timeouts[0] = 0
+        state.playerCount += 1
+        return 0
+    else:
+        for i in range(6):
+            if i not in state.table:
+                state.table[i] = [username, 4, False]
+                state.timeouts[i] = 0
+                state.playerCount += 1
+                return i
+
+def table_delta(state):
+    # Seats that changed since the last call: seat -> [username, lives,
+    # isDealer], or None for a seat that was left. Bumps state.tableSeq.
+    delta = {}
+    if state.table.version != state.syncedVersion:
+        for seat, entry in state.table.items():
+            if state.syncedTable.get(seat) != entry:
+                delta[seat] = list(entry)
+        for seat in state.syncedTable:
+            if seat not in state.table:
+                delta[seat] = None
+        state.syncedTable = {seat: list(entry) for seat, entry in state.table.items()}
+        state.syncedVersion = state.table.version
+    state.tableSeq += 1
+    return delta
+
+def table_frame(state):
+    # the whole table as a text TABLE message, encoded once per change
+    return state.table.cached(TEXT, lambda: encode(TEXT, "TABLE", json.dumps(state.table)))
+
+def snapshot_frame(state):
+    # SNAPSHOT of the table as of tableSeq, encoded once per tableSeq
+    if state.snapshot is None or state.snapshot[0] != state.tableSeq:
+        state.snapshot = (state.tableSeq, encode(FRAMED, "SNAPSHOT", state.tableSeq, json.dumps(state.syncedTable)))
+    return state.snapshot[1]
+
+def record_timeout(state, seat):
+    # -> how many times this player has now run out of time
+    state.timeouts[seat] = state.timeouts.get(seat, 0) + 1
+    return state.timeouts[seat]
+
+def new_dealer(state):
+    if state.dealer in state.table:
+        state.table[state.dealer][2] = False
+    new_dealer = (state.dealer + 1) % 6
+    while True:
+        if new_dealer in state.table and state.table[new_dealer][1] > 0:
+            state.dealer = new_dealer
+            state.table[state.dealer][2] = True
+            break
+        else:
+            new_dealer = (new_dealer + 1) % 6
+
+def players_left(state):
+    alive = sum(1 for seat in state.table.values() if seat[1] > 0)
+    
+    # more than 1 player
+    if alive > 1:
+        return 1
+    # only 1 player left
+    elif alive == 1:
+        return 0
+    # no players left: means a tie where all players had 1 life left. so no one should lose a life
+    else:
+        return -1
+
+def generate_flip_order(state):
+    dealer_seat = state.dealer
+    flip_order = []
+    
+    for i in range(6):
+        seat = (dealer_seat + 1 + i) % 6
+        if seat in state.table and state.table[seat][1] > 0:
+            flip_order.append(seat)
+    
+    return flip_order
+
+def reset_lives(state):
+    for seat, data in state.table.items():
+        data[1] = 4
+    new_dealer(state)
@@ -0,0 +1,83 @@
+import math
+
+# What a table is doing between games, as an explicit state machine:
+#
+#   WAITING --2nd player joins--> COUNTDOWN --countdown runs out--> RUNNING
+#      ^                              |                                |
+#      +---- down to 1 player --------+                          game ends
+#      |                                                               v
+#      +----------------- reopen() once the table is reset ------- GAME_OVER
+#
+# The servers feed it events as they happen (players_changed on a join or
+# leave, tick when its timer is due, game_over/reopen around a game) and
+# broadcast the WAITING line each call hands back. Nothing polls: timeout()
+# is the only timer, and it only runs during a countdown, waking when the
+# seconds shown change and when the game starts. A table waiting for
+# players sleeps until somebody joins or leaves.
+
+WAITING = "waiting"
+COUNTDOWN = "countdown"
+RUNNING = "running"
+GAME_OVER = "game over"
+
+WAITING_FOR_PLAYERS = "Waiting for more players to join"
+
+class Lobby:
+    def __init__(self):
+        self.phase = WAITING
+        self.deadline = None    # clock time the countdown ends
+        self.shown = None       # WAITING line players were last sent
+
+    def countdown_line(self, now):
+        return f"Game will begin in {math.ceil(max(self.deadline - now, 0)):02}"
+
+    def players_changed(self, playerCount, countdown, now):
+        # A join or leave outside a game -> WAITING line to broadcast (so a
+        # new player gets it too), or None. countdown: seconds before a
+        # game starts once two players are seated.
+        if self.phase in (RUNNING, GAME_OVER):
+            return None
+        if playerCount < 2:
+            self.phase = WAITING
+            self.deadline = None
+            self.shown = WAITING_FOR_PLAYERS if playerCount == 1 else None
+        else:
+            if self.phase == WAITING:
+                self.phase = COUNTDOWN
+                self.deadline = now + countdown
+            self.shown = self.countdown_line(now)
+        return self.shown
+
+    def timeout(self, now):
+        # seconds until tick() is due, None when no timer is needed
+        if self.phase != COUNTDOWN:
+            return None
+        remaining = self.deadline - now
+        if remaining <= 0:
+            return 0
+        # the next whole second, when the number shown goes down
+        return remaining - math.ceil(remaining) + 1
+
+    def tick(self, now):
+        # The timer is due -> WAITING line to broadcast, or None. Moves to
+        # RUNNING once the countdown has run out; the caller starts the game.
+        if self.phase != COUNTDOWN:
+            return None
+        if now >= self.deadline:
+            self.phase = RUNNING
+            self.deadline = None
+            self.shown = None
+            return None
+        line = self.countdown_line(now)
+        if line == self.shown:
+            return None
+        self.shown = line
+        return line
+
+    def game_over(self):
+        self.phase = GAME_OVER
+
+    def reopen(self, playerCount, countdown, now):
+        # back to the lobby after a game -> WAITING line to broadcast, or None
+        self.phase = WAITING
+        return self.players_changed(playerCount, countdown, now)
@@ -0,0 +1,188 @@
+import threading
+import collections
+import select
+from socket import SHUT_RDWR, MSG_PEEK
+
+# Buffered reading for the blocking sockets used by server.py and player.py.
+# Protocol lines used to be read one recv(1) at a time; BufferedConn pulls
+# whole chunks into a reusable buffer and hands out lines and exact-size
+# payloads from it.
+#
+# Writes go straight to the socket unless the connection has an Outbox
+# (server.py gives every seated player one): then sendall just queues the
+# bytes and a writer thread per connection sends them, so a broadcast never
+# waits on a slow client.
+
+RECV_SIZE = 65536
+OUTBOX_HIGH_WATER = 256 * 1024  # bytes queued for one client before it is dropped
+
+class BufferedConn:
+    def __init__(self, sock, size=RECV_SIZE):
+        self.sock = sock
+        self.buf = bytearray(size)
+        self.view = memoryview(self.buf)
+        self.start = 0  # first unread byte
+        self.end = 0    # end of buffered data
+        self.version = 1  # wire protocol version, negotiated at join (see protocol.py)
+        self.outbox = None
+
+    def startOutbox(self, highWater=OUTBOX_HIGH_WATER):
+        self.outbox = Outbox(self.sock, highWater)
+
+    def sendall(self, data):
+        if self.outbox is None:
+            self.sock.sendall(data)
+        else:
+            self.outbox.put(data)
+
+    def close(self):
+        if self.outbox is None:
+            self.sock.close()
+        else:
+            self.outbox.close()
+
+    def __getattr__(self, name):
+        # everything else (connect, settimeout, ...) goes to the socket
+        return getattr(self.sock, name)
+
+    def _fill(self):
+        if self.start == self.end:
+            self.start = self.end = 0
+        elif self.end == len(self.buf):
+            pending = self.end - self.start
+            if self.start == 0:
+                # a single message bigger than the buffer: grow it
+                self.view.release()
+                buf = bytearray(len(self.buf) * 2)
+                buf[:pending] = self.buf
+                self.buf = buf
+                self.view = memoryview(self.buf)
+            else:
+                self.buf[:pending] = self.buf[self.start:self.end]
+            self.start = 0
+            self.end = pending
+        n = self.sock.recv_into(self.view[self.end:])
+        self.end += n
+        return n
+
+    def readable(self, timeout=0):
+        # True once there is something to read (or the peer closed), waiting
+        # at most timeout seconds. Unlike settimeout this leaves the socket
+        # blocking for the Outbox writer thread.
+        if self.start < self.end:
+            return True
+        return bool(select.select([self.sock], [], [], max(timeout, 0))[0])
+
+    def alive(self):
+        # False once sends have failed or the peer has hung up. Only peeks,
+        # so nothing the player sent is lost.
+        if self.outbox is not None and self.outbox.failed:
+            return False
+        if self.start < self.end or not self.readable(0):
+            return True
+        try:
+            return self.sock.recv(1, MSG_PEEK) != b""
+        except OSError:
+            return False
+
+    def peek(self):
+        # a copy of what is buffered but not handed out yet
+        return bytes(self.buf[self.start:self.end])
+
+    def fill(self, timeout):
+        # Buffer whatever arrives within timeout seconds -> bytes read, 0
+        # once the peer has closed, None if nothing came
+        if not select.select([self.sock], [], [], max(timeout, 0))[0]:
+            return None
+        return self._fill()
+
+    def getLine(self):
+        while True:
+            i = self.buf.find(b'\n', self.start, self.end)
+            if i >= 0:
+                msg = self.buf[self.start:i].decode()
+                self.start = i + 1
+                return msg
+            if not self._fill():
+                # connection closed: hand back whatever was left
+                msg = self.buf[self.start:self.end].decode()
+                self.start = self.end
+                return msg
+
+    def recvAll(self, size):
+        data = bytearray(size)
+        got = min(size, self.end - self.start)
+        data[:got] = self.view[self.start:self.start + got]
+        self.start += got
+        view = memoryview(data)
+        while got < size:
+            more = self.sock.recv_into(view[got:])
+            if not more:
+                raise EOFError('Socket closed before receiving full data')
+            got += more
+        return bytes(data)
+
+class Outbox:
+    # Bounded queue of outgoing bytes for one connection, sent by its own
+    # writer thread. A client that stops reading fills its queue past
+    # highWater and is dropped: the socket is shut down, so its reader sees
+    # EOF and every later put raises ConnectionResetError like a dead socket.
+    def __init__(self, sock, highWater=OUTBOX_HIGH_WATER):
+        self.sock = sock
+        self.highWater = highWater
+        self.queue = collections.deque()
+        self.queued = 0         # bytes in queue
+        self.ready = threading.Condition()
+        self.closing = False    # no more puts, close the socket once flushed
+        self.failed = None      # why the connection was dropped
+        threading.Thread(target=self._run, daemon=True).start()
+
+    def put(self, data):
+        with self.ready:
+            if self.failed or self.closing:
+                raise ConnectionResetError(self.failed or "connection closed")
+            if self.queued + len(data) > self.highWater:
+                self._fail("outbound queue over high-water mark")
+                raise ConnectionResetError(self.failed)
+            self.queue.append(data)
+            self.queued += len(data)
+            self.ready.notify()
+
+    def close(self):
+        with self.ready:
+            self.closing = True
+            self.ready.notify()
+            if self.failed:
+                self.sock.close()
+
+    def _fail(self, reason):
+        # caller holds self.ready
+        self.failed = reason
+        self.queue.clear()
+        self.queued = 0
+        try:
+            self.sock.shutdown(SHUT_RDWR)
+        except OSError:
+            pass
+        self.ready.notify()
+
+    def _run(self):
+        while True:
+            with self.ready:
+                while not self.queue and not self.closing and not self.failed:
+                    self.ready.wait()
+                if self.failed or not self.queue:
+                    break
+                data = self.queue.popleft()
+            try:
+                self.sock.sendall(data)
+            except OSError as e:
+                with self.ready:
+                    self._fail(str(e))
+                break
+            with self.ready:
+                self.queued -= len(data)
+        # a dropped socket stays open (shut down) until close(), so the
+        # game can still poll it and see EOF
+        if self.closing:
+            self.sock.close()
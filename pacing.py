@@ -0,0 +1,62 @@
+# How long a table pauses at each point of a game. Every table carries its
+# own profile, so bot/load-test tables can run in turbo next to normal ones.
+#
+# Points listed in `acks` don't sleep at all: the server waits until every
+# client that speaks the framed protocol has sent ACK (player.py does once
+# the reveal animation is done), giving up after `ackTimeout` seconds.
+#
+# A player gets `decisionTimeout` seconds to keep or switch (framed clients
+# are told with a DEADLINE message and show a countdown). After that, plus
+# DECISION_GRACE for the answer to arrive, DEFAULT_ACTION is played for them.
+
+DEFAULT_ACTION = "keep"
+DECISION_GRACE = 1.0
+
+POINTS = [
+    "deal",                 # after cards are dealt
+    "new_card",             # after sending a player their switched card
+    "turn",                 # after each player's turn
+    "decisions_done",       # after the last decision, before the reveal
+    "reveal",               # after the reveal, before counting losers
+    "losers",               # before announcing the losers
+    "round_end",            # after announcing the losers
+    "table",                # after a TABLE update between rounds
+    "game_over",            # after announcing the winner
+    "countdown",            # lobby countdown before a game starts, see lobby.py
+    "disconnect",           # after a disconnect, before telling the table
+    "disconnect_notice",    # after telling the table the game ended
+]
+
+class Pacing:
+    def __init__(self, name, delays, acks=(), ackTimeout=5.0, decisionTimeout=20.0):
+        self.name = name
+        self.delays = delays        # point -> seconds
+        self.acks = set(acks)       # points that wait for client ACKs instead
+        self.ackTimeout = ackTimeout
+        self.decisionTimeout = decisionTimeout
+
+    def delay(self, point):
+        return self.delays[point]
+
+    def with_decision_timeout(self, seconds):
+        return Pacing(self.name, self.delays, self.acks, self.ackTimeout, seconds)
+
+NORMAL = Pacing("normal", {
+    "deal": 1,
+    "new_card": 0.1,
+    "turn": 1,
+    "decisions_done": 1,
+    "reveal": 3,
+    "losers": 3,
+    "round_end": 3,
+    "table": 2,
+    "game_over": 3,
+    "countdown": 30,
+    "disconnect": 1,
+    "disconnect_notice": 3,
+})
+
+# the short countdown lets bots that connect together sit at one table
+TURBO = Pacing("turbo", dict.fromkeys(POINTS, 0) | {"countdown": 0.05}, acks=["reveal"], decisionTimeout=5.0)
+
+PROFILES = {pacing.name: pacing for pacing in (NORMAL, TURBO)}
@@ -1,113 +1,172 @@
-from socket import *
 from ui_functions import *
+from client import *
+from eventlog import *
 import sys
-import select
 import time
+import queue
+import threading
 import curses
-import json
-import os
 import traceback
 
-def parse_list(message):
-    return [int(x) for x in message.split(",")]
-
-def getLine(conn):
-    msg = b''
-    while True:
-        ch = conn.recv(1)
-        if not ch:
-            break
-        msg += ch
-        if ch == b'\n':
-            break
-    return msg.decode()[:-1]
-
-def recvAll(sock, size):
-    data = b''
-    while len(data) < size:
-        more = sock.recv(size - len(data))
-        if not more:
-            raise EOFError('Socket closed before receiving full data')
-        data += more
-    return data
-
-serverIP = sys.argv[1]
-serverPort = int(sys.argv[2])
-username = sys.argv[3]
+# player.py {ip} {port} {username}, or --watch [table id] to spectate,
+# or player.py --replay {event log} [game id [speed]] to watch a recorded game
+REPLAY_SPEED = 4
+replaying = sys.argv[1] == "--replay"
+if replaying:
+    replayLog = sys.argv[2]
+    replayGame = int(sys.argv[3]) if len(sys.argv) > 3 else None
+    replaySpeed = float(sys.argv[4]) if len(sys.argv) > 4 else REPLAY_SPEED
+else:
+    serverIP = sys.argv[1]
+    serverPort = int(sys.argv[2])
+    watching = sys.argv[3] == "--watch"
+    username = None if watching else sys.argv[3]
+    watchTable = int(sys.argv[4]) if watching and len(sys.argv) > 4 else None
+
+class CursesPlayer(TableTracker):
+    def __init__(self, stdscr):
+        self.stdscr = stdscr
+        self.deadline = None    # seconds for the next decision, see DEADLINE
+
+    def on_rejected(self, reason):
+        curses.endwin()
+        print(f"Connection rejected: {reason}")
+
+    def on_waiting(self, message):
+        table_message(self.stdscr, message)
+
+    def on_table(self, table):
+        draw_table(self.stdscr, table)
+
+    def on_deal(self, flip_order, card):
+        deal(self.stdscr, flip_order, card)
+
+    def on_flip_card(self, seat, card):
+        flip_card_at_position(self.stdscr, seat, card)
+
+    def on_player_action(self, seat, action):
+        player_action(self.stdscr, seat, action)
+
+    def on_deadline(self, seconds):
+        self.deadline = seconds
+
+    def on_decision(self, card):
+        deadline, self.deadline = self.deadline, None
+        return decision_card(self.stdscr, card, deadline)
+
+    def on_new_card(self, card):
+        new_card(self.stdscr, card)
+
+    def on_reveal(self, flip_order, player_cards):
+        reveal_cards(self.stdscr, flip_order, player_cards)
+
+    def on_losers(self, usernames, cards):
+        losers(self.stdscr, usernames, cards)
+
+class Receiver:
+    # Reads from the server on its own thread so the animations never hold
+    # up the socket. Messages wait on a queue for the UI; PINGs are answered
+    # straight away, and a dropped connection is resumed from here.
+    def __init__(self, conn):
+        self.conn = conn
+        self.token = None                   # from RESUME_TOKEN
+        self.events = queue.Queue()         # (msgType, fields, time received)
+        self.arrived = threading.Event()    # set while events are waiting
+        self.sendLock = threading.Lock()
+        threading.Thread(target=self.run, daemon=True).start()
+
+    def send(self, *message):
+        with self.sendLock:
+            send_message(self.conn, *message)
+
+    def put(self, msgType, fields):
+        self.events.put((msgType, fields, time.time()))
+        self.arrived.set()
+
+    def get(self):
+        event = self.events.get()
+        if self.events.empty():
+            self.arrived.clear()
+            if not self.events.empty():
+                self.arrived.set()
+        return event
+
+    def pause(self, seconds):
+        # animation delay that ends as soon as the next message is in
+        self.arrived.wait(seconds)
+
+    def run(self):
+        while True:
+            try:
+                msgType, fields = read_message(self.conn)
+                if msgType is None:
+                    raise ConnectionResetError("server closed the connection")
+            except OSError as e:
+                if self.token is not None:
+                    # mid-game the server holds our seat for a while
+                    self.put("WAITING", ["Connection lost - reconnecting"])
+                    self.conn.close()
+                    conn = reconnect(serverIP, serverPort, self.token)
+                    if conn is not None:
+                        with self.sendLock:
+                            self.conn = conn
+                        continue
+                self.put(None, [str(e)])
+                return
+            if msgType == "PING":
+                self.send("PONG")
+                continue
+            if msgType == "RESUME_TOKEN":
+                self.token = fields[0]
+            self.put(msgType, fields)
+            if msgType == "REJECTED":
+                return
+
+def replay(stdscr):
+    # Plays a game from an event log as a spectator saw it, replaySpeed
+    # times faster: both the gaps between messages and the animations
+    curses.curs_set(0)
+    stdscr.clear()
+    player = CursesPlayer(stdscr)
+    set_pause(lambda seconds: time.sleep(seconds / replaySpeed))
+    start = time.time()
+    for t, msgType, fields in game_messages(replayLog, replayGame):
+        delay = start + t / replaySpeed - time.time()
+        if delay > 0:
+            time.sleep(delay)
+        dispatch(player, msgType, fields)
+    flush_input_curses(stdscr)
+    stdscr.getch()
 
 def main(stdscr):
     curses.curs_set(0)
     stdscr.clear()
-    serverSock = socket(AF_INET, SOCK_STREAM)
+    player = CursesPlayer(stdscr)
     try:
-        serverSock.connect((serverIP, serverPort))
-        serverSock.sendall((username + "\n").encode())
+        receiver = Receiver(connect(serverIP, serverPort, username, watch=watching, table=watchTable))
+        set_pause(receiver.pause)
 
         while True:
+            msgType, fields, received = receiver.get()
+            if msgType is None:
+                curses.endwin()
+                print(f"Error: {fields[0]}")
+                break
             try:
-                msg = getLine(serverSock)
-                if not msg:
-                    break
+                if msgType == "DEADLINE":
+                    # count down from when it arrived, not from when we got to it
+                    fields = [max(float(fields[0]) - (time.time() - received), 0)]
 
-                if msg[0:8] == "REJECTED":
-                    curses.endwin()
-                    reason = msg[9:]
-                    print(f"Connection rejected: {reason}")
-                    break
+                answer = reply(msgType, dispatch(player, msgType, fields))
+                if answer:
+                    receiver.send(*answer)
 
-                elif msg[0:7] == "WAITING":
-                    message = msg[8:]
-                    table_message(stdscr, message)
-
-                elif msg[0:5] == "TABLE":
-                    dataSize = int(msg[6:])
-                    data = serverSock.recv(dataSize).decode()
-                    table_json = json.loads(data)
-                    table = {int(k): v for k, v in table_json.items()}
-                    draw_table(stdscr, table)
-
-                elif msg[0:4] == "DEAL":
-                    _, str_flip_order, player_card = msg.split(":")
-                    flip_order = parse_list(str_flip_order)
-                    deal(stdscr, flip_order, player_card)
-
-                elif msg[0:9] == "FLIP_CARD":
-                    _, seat, card = msg.split(":")
-                    flip_card_at_position(stdscr, int(seat), card)
-
-                elif msg[0:13] == "PLAYER_ACTION":
-                    seat = int(msg[14:15])
-                    action = msg[16:]
-                    player_action(stdscr, seat, action)
-
-                elif msg[0:8] == "DECISION":
-                    card = msg[9:]
-                    decision = decision_card(stdscr, card)
-                    serverSock.sendall(decision.encode())
-
-                elif msg[0:8] == "NEW_CARD":
-                    card = msg[9:]
-                    new_card(stdscr, card)
-
-                elif msg[0:6] == "REVEAL":
-                    _, strSize, strFlipOrder = msg.split(":")
-                    flip_order = parse_list(strFlipOrder)
-                    dataSize = int(strSize)
-                    data = serverSock.recv(dataSize).decode()
-                    data_json = json.loads(data)
-                    player_cards = {int(k): v for k, v in data_json.items()}
-                    reveal_cards(stdscr, flip_order, player_cards)
-
-                elif msg[0:6] == "LOSERS":
-                    _, strUsernames, strCards = msg.split(":")
-                    usernames = strUsernames.split(",")
-                    cards = strCards.split(",")
-                    losers(stdscr, usernames, cards)
+                if msgType == "REJECTED":
+                    break
 
-            except OSError as e:
-                curses.endwin()
-                print(f"Error: {e}")
-                break
+            except OSError:
+                # the receiver sees the same failure and reconnects or gives up
+                pass
             except Exception as e:
                 print(f"Unexpected error while processing message: {e}")
                 traceback.print_exc()
@@ -118,4 +177,4 @@ def main(stdscr):
 
 
 if __name__ == "__main__":
-    curses.wrapper(main)
+    curses.wrapper(replay if replaying else main)
@@ -0,0 +1,205 @@
+import time
+import struct
+import asyncio
+import functools
+
+# Wire format for server <-> player messages.
+#
+# Version 1 (TEXT) is the original line protocol: "NAME:field:field\n", with
+# TABLE and REVEAL sending a size in the header line and the JSON payload
+# right after it. Clients that just send their username get this format.
+#
+# Version 2 (FRAMED) is negotiated by sending "HELLO:{version}:{username}\n"
+# as the first line; the server answers "HELLO:{version}\n" with the version
+# it will use. Every HELLO, RESUME and WATCH line gets that answer, even one
+# asking for version 1; only a bare username (the original join) gets none.
+# A framed player is sent a RESUME_TOKEN when seated; if their
+# connection drops mid-game they can reconnect with "RESUME:{version}:{token}\n"
+# instead of HELLO and get their seat back (async_server.py only).
+# Spectators send "WATCH:{version}:{table id, or nothing for the busiest}\n"
+# instead and get every table message except the private ones (their DEAL
+# always says NONE); they are always framed (async_server.py only).
+# After that every message in both directions is one frame:
+#   1 byte message type | 4 byte payload length | payload
+# where the payload is the message fields joined with ":" (the last field
+# may itself contain ":", e.g. JSON).
+#
+# Text clients get the whole table as TABLE every time it is sent. Framed
+# clients get a SNAPSHOT when they join and then only TABLE_DELTA messages
+# with the seats that changed, numbered so a client that sees a gap can
+# send RESYNC for a fresh SNAPSHOT.
+
+TEXT = 1
+FRAMED = 2
+PROTOCOL_VERSION = FRAMED
+
+# message type -> number of fields. Frame type codes are the index in this
+# list, so only ever append to it.
+MESSAGE_TYPES = [
+    ("REJECTED", 1),        # reason
+    ("WAITING", 1),         # message
+    ("TABLE", 1),           # table json
+    ("DEAL", 2),            # flip order, card or NONE
+    ("FLIP_CARD", 2),       # seat, card
+    ("PLAYER_ACTION", 2),   # seat, action
+    ("DECISION", 1),        # card
+    ("NEW_CARD", 1),        # card
+    ("REVEAL", 2),          # flip order, cards json
+    ("LOSERS", 2),          # usernames, cards
+    ("PING", 0),
+    ("ACTION", 1),          # client -> server: keep or switch
+    ("ACK", 0),             # client -> server: caught up (see pacing.py)
+    ("DEADLINE", 1),        # seconds to answer the DECISION that follows (framed only)
+    ("SNAPSHOT", 2),        # seq, table json (framed only, replaces TABLE)
+    ("TABLE_DELTA", 2),     # seq, changed seats json, null = seat left (framed only)
+    ("RESYNC", 0),          # client -> server: missed a delta, send a SNAPSHOT
+    ("PONG", 0),            # client -> server: answer to PING
+    ("RESUME_TOKEN", 1),    # token to reclaim the seat after a drop (framed only)
+]
+MESSAGE_FIELDS = dict(MESSAGE_TYPES)
+TYPE_CODES = {name: code for code, (name, _) in enumerate(MESSAGE_TYPES)}
+
+FRAME_HEADER = struct.Struct("!BI")
+
+def negotiate(line):
+    # first line from a client -> (version, username, resume token or None)
+    if line.startswith("HELLO:"):
+        _, version, username = line.split(":", 2)
+        return max(TEXT, min(int(version), PROTOCOL_VERSION)), username, None
+    elif line.startswith("RESUME:"):
+        _, version, token = line.split(":", 2)
+        return max(FRAMED, min(int(version), PROTOCOL_VERSION)), None, token
+    return TEXT, line, None
+
+def greeted(line):
+    # does this first line get a welcome() back?
+    return line.startswith(("HELLO:", "RESUME:", "WATCH:"))
+
+def watch_request(line):
+    # first line from a spectator -> (version, table id or None), else None
+    if not line.startswith("WATCH:"):
+        return None
+    _, version, table = line.split(":", 2)
+    return max(FRAMED, min(int(version), PROTOCOL_VERSION)), int(table) if table else None
+
+def hello(username, version=PROTOCOL_VERSION):
+    return f"HELLO:{version}:{username}\n".encode()
+
+def resume_hello(token, version=PROTOCOL_VERSION):
+    return f"RESUME:{version}:{token}\n".encode()
+
+def watch_hello(table=None, version=PROTOCOL_VERSION):
+    return f"WATCH:{version}:{'' if table is None else table}\n".encode()
+
+def welcome(version):
+    # server's answer to hello()
+    return f"HELLO:{version}\n".encode()
+
+def encode(version, msgType, *fields):
+    fields = [str(field) for field in fields]
+    if version == TEXT:
+        return encode_text(msgType, fields)
+    payload = ":".join(fields).encode()
+    return FRAME_HEADER.pack(TYPE_CODES[msgType], len(payload)) + payload
+
+# lobby WAITING lines repeat every tick; each distinct one is encoded once
+encode_repeated = functools.lru_cache(maxsize=256)(encode)
+
+def encode_text(msgType, fields):
+    if msgType == "TABLE":
+        payload = fields[0].encode()
+        return f"TABLE:{len(payload)}\n".encode() + payload
+    elif msgType == "REVEAL":
+        payload = fields[1].encode()
+        return f"REVEAL:{len(payload)}:{fields[0]}\n".encode() + payload
+    elif msgType == "ACTION":
+        return f"{fields[0]}\n".encode()
+    elif not fields:
+        return f"{msgType}\n".encode()
+    return f"{msgType}:{':'.join(fields)}\n".encode()
+
+def decode_frame(code, payload):
+    msgType, count = MESSAGE_TYPES[code]
+    if count == 0:
+        return msgType, []
+    return msgType, payload.decode().split(":", count - 1)
+
+def split_text(line):
+    # -> (msgType, fields, payload size still to be read)
+    msgType, _, rest = line.partition(":")
+    if msgType == "TABLE":
+        return msgType, [], int(rest)
+    elif msgType == "REVEAL":
+        size, flip_order = rest.split(":")
+        return msgType, [flip_order], int(size)
+    elif msgType not in MESSAGE_FIELDS:
+        # text clients answer DECISION with a bare "keep"/"switch" line
+        return "ACTION", [line], 0
+    count = MESSAGE_FIELDS[msgType]
+    if count == 0:
+        return msgType, [], 0
+    return msgType, rest.split(":", count - 1), 0
+
+def send_message(conn, msgType, *fields):
+    conn.sendall(encode(conn.version, msgType, *fields))
+
+def read_message(conn):
+    # Blocking read of one message from a netio.BufferedConn.
+    # Returns (msgType, fields), or (None, []) once the connection closes.
+    try:
+        if conn.version == TEXT:
+            line = conn.getLine()
+            if not line:
+                return None, []
+            msgType, fields, size = split_text(line)
+            if size:
+                fields.append(conn.recvAll(size).decode())
+            return msgType, fields
+        code, size = FRAME_HEADER.unpack(conn.recvAll(FRAME_HEADER.size))
+        return decode_frame(code, conn.recvAll(size))
+    except EOFError:
+        return None, []
+
+def message_complete(version, data):
+    # does data (from a client) start with a whole message?
+    if version == TEXT:
+        end = data.find(b"\n")
+        if end < 0:
+            return False
+        try:
+            size = split_text(data[:end].decode())[2]
+        except (UnicodeDecodeError, ValueError):
+            return True     # read_message raises it
+        return len(data) > end + size
+    if len(data) < FRAME_HEADER.size:
+        return False
+    return len(data) >= FRAME_HEADER.size + FRAME_HEADER.unpack_from(data)[1]
+
+def read_message_by(conn, deadline):
+    # read_message that waits for the rest of a message only until deadline
+    # (a time.time()), so a client that sends half a frame can't hold us.
+    # -> (msgType, fields), (None, []) once the connection closes, or None
+    # at the deadline
+    while not message_complete(conn.version, conn.peek()):
+        got = conn.fill(deadline - time.time())
+        if got is None:
+            return None
+        if not got:
+            return None, []
+    return read_message(conn)
+
+async def read_message_async(reader, version):
+    # asyncio.StreamReader version of read_message
+    try:
+        if version == TEXT:
+            line = await reader.readline()
+            if not line:
+                return None, []
+            msgType, fields, size = split_text(line.decode().rstrip("\n"))
+            if size:
+                fields.append((await reader.readexactly(size)).decode())
+            return msgType, fields
+        code, size = FRAME_HEADER.unpack(await reader.readexactly(FRAME_HEADER.size))
+        return decode_frame(code, await reader.readexactly(size))
+    except asyncio.IncompleteReadError:
+        return None, []
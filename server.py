@@ -1,101 +1,75 @@
 from socket import *
 import threading
+import select
+import queue
 import sys
 import time
-import random
 import json
 import traceback
+import argparse
+from game import *
+from engine import *
+from netio import *
+from protocol import *
+from eventlog import *
+from metrics import *
 
 class PlayerDisconnect(Exception):
     pass
 
-class GameState:
-    def __init__(self):
-        self.table = {}            # seat -> [username, lives, isDealer]
-        self.playerConnections = {} # seat -> socket
-        self.playerCount = 0
-        self.gameRunning = False
-        self.startGameThreadRunning = False
-        self.cancelCountdown = False
-        self.lock = threading.Lock()
-        self.dealer = None
-
-def create_list_string(data):
-    # Flatten the list if it contains sublists
-    flattened_data = []
-    for item in data:
-        if isinstance(item, list):  # Check if the item is a list
-            flattened_data.extend(item)  # Add the sublist elements to the flattened list
-        else:
-            flattened_data.append(item)  # Otherwise, add the item itself
-
-    # Now join the flattened list
-    return ",".join(map(str, flattened_data))
-
-def create_shuffled_deck():
-    values = ['A'] + [str(n) for n in range(2, 11)] + ['J', 'Q', 'K']
-    suits = ['♠', '♥', '♦', '♣']
-    deck = [f"{value}{suit}" for suit in suits for value in values]
-    random.shuffle(deck)
-    return deck
-
-def get_losing_seats(table):
-    rank_order = {'A': 1, '2': 2, '3': 3, '4': 4, '5': 5, '6': 6, '7': 7,
-                  '8': 8, '9': 9, '10': 10, 'J': 11, 'Q': 12, 'K': 13}
-
-    seat_ranks = {}
-    for seat, card in table.items():
-        if len(card) > 1:
-            rank = card[1][:-1]  # Remove suit
-        else:
-            rank = card[0][:-1]  # Remove suit
-        seat_ranks[seat] = rank_order[rank]
-
-    min_rank = min(seat_ranks.values())
-
-    losing_seats = [seat for seat, rank in seat_ranks.items() if rank == min_rank]
-
-    return losing_seats
-
-def getLine(conn):
-    msg = b''
-    while True:
-        ch = conn.recv(1)
-        if not ch:
-            break
-        msg += ch
-        if ch == b'\n':
-            break
-    return msg.decode()[:-1]
-
-def addPlayer(state, username):
-    if state.playerCount == 0:
-        state.table[0] = [username, 4, True]  # Seat 0 is dealer
-        state.playerCount += 1
-        return 0
-    else:
-        for i in range(6):
-            if i not in state.table:
-                state.table[i] = [username, 4, False]
-                state.playerCount += 1
-                return i
-
-def broadcast(state, data):
+# The main thread owns the table: nothing else changes it, so nothing
+# locks it. handlePlayer threads only read state.view (see game.TableView)
+# to turn players away early, and queue a join on state.commands for the
+# main thread, waking it through this socket pair. Between games the main
+# thread sleeps in waitInLobby until a command arrives, a lobby player's
+# socket has something (a message or a leave) or the lobby's countdown
+# timer is due (see lobby.py); during a game it answers joins between
+# events.
+wakeReader, wakeWriter = socketpair()
+wakeWriter.setblocking(False)
+
+def broadcast(state, msgType, *fields):
+    # Only queues the message on each player's outbox (see netio.py); a
+    # player who can't take it is skipped and caught by the next direct send
+    start = time.perf_counter()
+    encoded = {}  # protocol version -> bytes, so each format is encoded once
+    encoder = encode_repeated if msgType == "WAITING" else encode
     for seat, conn in state.playerConnections.items():
+        data = encoded.get(conn.version)
+        if data is None:
+            data = encoded[conn.version] = encoder(conn.version, msgType, *fields)
         try:
-            if type(data) == str:
-                conn.sendall(data.encode())
-            else:
-                conn.sendall(data)
+            conn.sendall(data)
         except (BrokenPipeError, ConnectionResetError):
-            break
+            continue
+    BROADCAST_SECONDS.observe(time.perf_counter() - start)
+
+def broadcastTable(state):
+    # Full TABLE for text clients, TABLE_DELTA for framed ones
+    start = time.perf_counter()
+    delta = table_delta(state)
+    encoded = {
+        TEXT: table_frame(state),
+        FRAMED: encode(FRAMED, "TABLE_DELTA", state.tableSeq, json.dumps(delta)),
+    }
+    for seat, conn in state.playerConnections.items():
+        try:
+            conn.sendall(encoded[conn.version])
+        except (BrokenPipeError, ConnectionResetError):
+            continue
+    BROADCAST_SECONDS.observe(time.perf_counter() - start)
+
+def send_snapshot(state, conn):
+    # the table for a joining or resyncing player: SNAPSHOT as of the last
+    # broadcastTable, or the whole current table for text clients
+    conn.sendall(table_frame(state) if conn.version == TEXT else snapshot_frame(state))
 
 
 def listenForPlayers(state, listenerSocket):
     while running:
         try:
             clientConn, clientAddr = listenerSocket.accept()
-            threading.Thread(target=handlePlayer, args=(state, (clientConn, clientAddr)), daemon=True).start()
+            threading.Thread(target=handlePlayer, args=(state, (BufferedConn(clientConn), clientAddr)), daemon=True).start()
         except Exception as e:
             print(f"Accept failed: {e}")
             sys.exit(1)
@@ -103,324 +77,307 @@ def listenForPlayers(state, listenerSocket):
 def handlePlayer(state, connInfo):
     clientConn, clientAddr = connInfo
     print(f"Received connection from {clientAddr[0]}:{clientAddr[1]}")
-    username = getLine(clientConn)
-
-    with state.lock:
-        if state.gameRunning:
-            print("REJECTED CONNECTION: GAME_RUNNING")
-            clientConn.sendall("REJECTED:GAME_RUNNING\n".encode())
-            clientConn.close()
-            return
-        elif state.playerCount >= 6:
-            print("REJECTED CONNECTION: TABLE_FULL")
-            clientConn.sendall("REJECTED:TABLE_FULL\n".encode())
-            clientConn.close()
-            return
-
-        seat = addPlayer(state, username)
-        state.playerConnections[seat] = clientConn
-        
-        if state.dealer is None:
-            state.dealer = seat
-
-        print("Current table:", state.table)
-
-        table_json = json.dumps(state.table).encode()
-        broadcast(state, f"TABLE:{len(table_json)}\n")
-        time.sleep(0.1)
-        broadcast(state, table_json)
-
-def handleDisconnect(state):
-    with state.lock:
-        disconnected_seats = []
-        
-        # Identify disconnected players
-        for seat, conn in list(state.playerConnections.items()):
-            try:
-                # Check if connection is still alive
-                conn.send(b"PING\n")
-            except (BrokenPipeError, ConnectionResetError):
-                disconnected_seats.append(seat)
-        
-        for seat in disconnected_seats:
-            username = state.table[seat][0]
-            print(f"Player {username} disconnected from seat {seat}")
-            
-            try:
-                state.playerConnections[seat].close()
-            except:
-                pass
-            
-            # Remove from connections and table
-            del state.playerConnections[seat]
-            del state.table[seat]
-            state.playerCount -= 1
-            
-        if state.gameRunning:
-            state.gameRunning = False
-        elif state.startGameThreadRunning:
-            state.startGameThreadRunning = False
-            state.cancelCountdown = True
-
-def startGame(state):
-    if not state.cancelCountdown:
-        with state.lock:
-            state.gameRunning = True
-            state.startGameThreadRunning = False
+    try:
+        line = clientConn.getLine()
+        watch = watch_request(line)
+        if watch is not None:
+            clientConn.version, username, token = watch[0], None, None
+        else:
+            clientConn.version, username, token = negotiate(line)
+        if greeted(line):
+            clientConn.sendall(welcome(clientConn.version))
+    except (OSError, UnicodeDecodeError, ValueError):
+        clientConn.close()
+        return
+    if not username and watch is None and token is None:
+        # an empty first line, or a connection closed straight away
+        clientConn.close()
+        return
+    if watch is not None or token is not None:
+        # spectators and seat resumes are async_server.py only
+        rejectPlayer(clientConn, "NO_SPECTATORS" if watch is not None else "RESUME_FAILED")
+        return
+
+    reason = seatRefusal(state.view)
+    if reason is not None:
+        rejectPlayer(clientConn, reason)
+        return
+    state.commands.put(("join", clientConn, username))
+    wake()
+
+def seatRefusal(view):
+    # why a player can't sit down at a table that looks like view, or None
+    if view.running:
+        return "GAME_RUNNING"
+    elif view.players >= 6:
+        return "TABLE_FULL"
+    return None
+
+def rejectPlayer(conn, reason):
+    print(f"REJECTED CONNECTION: {reason}")
+    try:
+        send_message(conn, "REJECTED", reason)
+    except OSError:
+        pass
+    conn.close()
+
+def joinPlayer(state, conn, username):
+    # main thread: the table may have filled up or started since
+    # handlePlayer looked at it
+    reason = seatRefusal(state.view)
+    if reason is not None:
+        rejectPlayer(conn, reason)
+        return False
+
+    seat = addPlayer(state, username)
+    conn.startOutbox()
+
+    if state.dealer is None:
+        state.dealer = seat
+
+    print("Current table:", state.table)
+
+    # everyone else gets the new seat as a delta, the new player the whole table
+    broadcastTable(state)
+    try:
+        send_snapshot(state, conn)
+    except (BrokenPipeError, ConnectionResetError):
+        pass
+    state.playerConnections[seat] = conn
+    update_view(state)
+    return True
+
+def serveCommands(state):
+    # Carry out everything queued for the main thread. Returns True if
+    # somebody sat down
+    joined = False
+    while True:
+        try:
+            command, conn, username = state.commands.get_nowait()
+        except queue.Empty:
+            return joined
+        if command == "join":
+            joined |= joinPlayer(state, conn, username)
+
+def wake():
+    try:
+        wakeWriter.send(b"\0")
+    except BlockingIOError:
+        pass    # a wake-up is already pending
+
+def say(state, line):
+    # a WAITING line from the lobby, if it gave one
+    if line is not None:
+        broadcast(state, "WAITING", line)
+
+def waitInLobby(state):
+    # Sleep until something happens to the table, then tell the lobby
+    lobby = state.lobby
+    conns = dict(state.playerConnections)
+    timeout = lobby.timeout(time.time())
+    if any(message_complete(conn.version, conn.peek()) for conn in conns.values()):
+        timeout = 0
+    ready = select.select([wakeReader] + [conn.sock for conn in conns.values()], [], [], timeout)[0]
+
+    changed = False
+    if wakeReader in ready:
+        wakeReader.recv(4096)
+    for seat, conn in conns.items():
+        if conn.sock in ready or message_complete(conn.version, conn.peek()):
+            changed |= lobbyMessage(state, seat, conn)
+    changed |= serveCommands(state)
+
+    now = time.time()
+    if changed:
+        say(state, lobby.players_changed(state.playerCount, state.pacing.delay("countdown"), now))
+    say(state, lobby.tick(now))
+    if lobby.phase == RUNNING:
+        state.gameRunning = True
+        update_view(state)
         print("GAME STARTED")
-    else:
-        state.cancelCountdown = False
 
-def get_player_action(conn, card):
-    conn.sendall(f"DECISION:{card}\n".encode())
-    decision = getLine(conn)
-    return decision
+def lobbyMessage(state, seat, conn):
+    # A lobby player sent something or hung up. Returns True if they left
+    try:
+        message = read_message_by(conn, time.time())
+        if message is None:
+            return False    # only part of a message so far
+        msgType, fields = message
+        if msgType == "RESYNC":
+            send_snapshot(state, conn)
+        if msgType is not None:
+            return False
+    except OSError:
+        pass
+    removePlayer(state, seat)
+    if state.playerCount > 0:
+        if state.dealer not in state.table:
+            new_dealer(state)
+        broadcastTable(state)
+    return True
+
+def removePlayer(state, seat):
+    print(f"Player {state.table[seat][0]} disconnected from seat {seat}")
+    try:
+        state.playerConnections[seat].close()
+    except:
+        pass
+
+    # Remove from connections and table
+    del state.playerConnections[seat]
+    del state.table[seat]
+    del state.timeouts[seat]
+    state.playerCount -= 1
+    if state.playerCount == 0:
+        state.dealer = None
+    update_view(state)
+    DISCONNECTS.inc()
 
-def new_dealer(state):
-    if state.dealer in state.table:
-        state.table[state.dealer][2] = False
-    new_dealer = (state.dealer + 1) % 6
+def handleDisconnect(state):
+    # A send or read failed mid-game: drop whoever has gone. There is no
+    # seat resume here (see async_server.py), so the game ends for everyone.
+    for seat, conn in list(state.playerConnections.items()):
+        if not conn.alive():
+            removePlayer(state, seat)
+
+    state.gameRunning = False
+    update_view(state)
+
+def get_player_action(state, seat, conn, card):
+    # The player's answer, or DEFAULT_ACTION once their deadline has passed
+    timeout = state.pacing.decisionTimeout
+    # an answer that missed an earlier deadline is still waiting: drop it
     while True:
-        if new_dealer in state.table and state.table[new_dealer][1] > 0:
-            state.dealer = new_dealer
-            state.table[state.dealer][2] = True
+        message = read_message_by(conn, time.time())
+        if message is None:
             break
-        else:
-            new_dealer = (new_dealer + 1) % 6
-
-def players_left(state):
-    alive = sum(1 for seat in state.table.values() if seat[1] > 0)
-    
-    # more than 1 player
-    if alive > 1:
-        return 1
-    # only 1 player left
-    elif alive == 1:
-        return 0
-    # no players left: means a tie where all players had 1 life left. so no one should lose a life
-    else:
-        return -1
-
-def generate_flip_order(state):
-    dealer_seat = state.dealer
-    flip_order = []
-    
-    for i in range(6):
-        seat = (dealer_seat + 1 + i) % 6
-        if seat in state.table and state.table[seat][1] > 0:
-            flip_order.append(seat)
-    
-    return flip_order
-
-def reset_lives(state):
-    for seat, data in state.table.items():
-        data[1] = 4
-    new_dealer(state)
-
-def play_round(state, deck, order, flip_order):
-    table = {}
-    flip_order_string = create_list_string(flip_order)
-
-    # Deal cards out
-    for seat in order:
-        conn = state.playerConnections[seat]
-        if seat in flip_order:
-            card = deck.pop()
-            table[seat] = [card]
-            conn.sendall(f"DEAL:{flip_order_string}:{card}\n".encode())
-        else:
-            conn.sendall(f"DEAL:{flip_order_string}:NONE\n".encode())
-
-    print(table)
-
-    time.sleep(1)
-
-    # Ask first player for decision
-    first_seat = flip_order[0]
-
-    if table[first_seat][0][:-1] == "K":
-        broadcast(state, f"FLIP_CARD:{first_seat}:{table[first_seat][0]}\n")
-    else:
-        conn = state.playerConnections[first_seat]
-        decision = get_player_action(conn, table[first_seat][0])
-        if decision == "switch":
-            # switch cards in table
-            next_seat = flip_order[1]
-
-            if table[next_seat][0][:-1] != "K":
-                temp = table[first_seat]
-                table[first_seat] = table[next_seat]
-                table[next_seat] = temp
-                # send player new card
-                conn.sendall(f"NEW_CARD:{table[first_seat][0]}\n".encode())
-                time.sleep(0.1)
-
-        # broadcast decision
-        broadcast(state, f"PLAYER_ACTION:{first_seat}:{decision}\n")
-
-    time.sleep(1)
-
-    # Ask remaining players for decision
-    if flip_order[1:-1]:
-        for seat in flip_order[1:-1]:
-            if table[seat][0][0] == "K":
-                broadcast(state, f"FLIP_CARD:{seat}:{table[seat][0]}\n")
-            else:
-                conn = state.playerConnections[seat]
-                decision = get_player_action(conn, table[seat][0])
-                if decision == "switch":
-                    # switch cards in table
-                    next_seat = (seat + 1) % 6
-                    while next_seat not in flip_order:
-                        next_seat = (next_seat + 1) % 6
-
-                    if table[next_seat][0][0] != "K":
-                        temp = table[seat]
-                        table[seat] = table[next_seat]
-                        table[next_seat] = temp
-                        # send player new card
-                        conn.sendall(f"NEW_CARD:{table[seat][0]}\n".encode())
-                        time.sleep(0.1)
-
-                # broadcast decision
-                broadcast(state, f"PLAYER_ACTION:{seat}:{decision}\n")
-            time.sleep(1)
-
-        # Ask Dealer 
-        seat = flip_order[-1]
-
-        if table[seat][0][0] == "K":
-            broadcast(state, f"FLIP_CARD:{seat}:{table[seat][0]}\n")
-        else:
-            conn = state.playerConnections[seat]
-            decision = get_player_action(conn, table[seat][0])
-            if decision == "switch":
-                # Give dealer card from the deck
-                table[seat].append(deck.pop())
-                # send player new card
-                conn.sendall(f"NEW_CARD:{table[seat][0]}\n".encode())
-                time.sleep(0.1)
-
-                # broadcast decision
-            broadcast(state, f"PLAYER_ACTION:{seat}:{decision}\n")
-        time.sleep(1)
+        msgType, fields = message
+        if msgType is None:
+            raise ConnectionResetError("player connection closed")
+        elif msgType == "RESYNC":
+            send_snapshot(state, conn)
+    if conn.version != TEXT:
+        send_message(conn, "DEADLINE", timeout)
+    send_message(conn, "DECISION", card)
+
+    start = time.perf_counter()
+    deadline = time.time() + timeout + DECISION_GRACE
+    while True:
+        message = read_message_by(conn, deadline)
+        if message is None:
+            break
+        msgType, fields = message
+        if msgType is None:
+            raise ConnectionResetError("player connection closed")
+        if msgType == "ACTION":
+            DECISION_SECONDS.observe(time.perf_counter() - start)
+            return fields[0]
+        elif msgType == "RESYNC":
+            send_snapshot(state, conn)
+
+    DECISION_SECONDS.observe(time.perf_counter() - start)
+    DECISION_TIMEOUTS.inc()
+    count = record_timeout(state, seat)
+    print(f"Player {state.table[seat][0]} ran out of time ({count} timeouts), playing {DEFAULT_ACTION}")
+    return DEFAULT_ACTION
+
+def pause(state, point):
+    start = time.perf_counter()
+    if point in state.pacing.acks:
+        wait_for_acks(state)
     else:
-        # only 2 players so this player is the dealer
-        seat = flip_order[1]
-
-        if table[seat][0][0] == "K":
-            broadcast(state, f"FLIP_CARD:{seat}:{table[seat][0]}\n")
-        else:
+        delay = state.pacing.delay(point)
+        if delay:
+            time.sleep(delay)
+    PACING_SECONDS.inc(time.perf_counter() - start, point)
+
+def wait_for_acks(state):
+    # Framed clients send ACK once they have caught up; text clients never
+    # do, so they aren't waited for
+    deadline = time.time() + state.pacing.ackTimeout
+    for seat, conn in list(state.playerConnections.items()):
+        if conn.version == TEXT:
+            continue
+        while True:
+            message = read_message_by(conn, deadline)
+            if message is None:
+                break
+            msgType, fields = message
+            if msgType in ("ACK", None):
+                break
+            elif msgType == "RESYNC":
+                send_snapshot(state, conn)
+
+def play_event(state, event):
+    # Turn one engine event into messages/pauses; answers decisions
+    kind = event[0]
+    if kind == "table":
+        broadcastTable(state)
+    elif kind == "pause":
+        pause(state, event[1])
+    elif kind == "new_deck":
+        RESHUFFLES.inc()
+        print("NEW DECK")
+    elif kind == "deal":
+        ROUNDS.inc()
+        _, order, flip_order, hands = event
+        flip_order_string = create_list_string(flip_order)
+        for seat in order:
             conn = state.playerConnections[seat]
-            decision = get_player_action(conn, table[seat][0])
-            if decision == "switch":
-                # Give dealer card from the deck
-                table[seat].append(deck.pop())
-                # send player new card
-                conn.sendall(f"NEW_CARD:{table[seat][0]}\n".encode())
-                # broadcast decision
-                time.sleep(0.1)
-            
-            # broadcast decision
-            broadcast(state, f"PLAYER_ACTION:{seat}:{decision}\n")
-
-        
-    time.sleep(1)
-
-    print(table)    
-    reveal_json = json.dumps(table).encode()
-    broadcast(state, f"REVEAL:{len(reveal_json)}:{flip_order_string}\n")
-    time.sleep(0.5)
-    broadcast(state, reveal_json)
-
-    time.sleep(3)
-
-    losing_seats = get_losing_seats(table)
-    losing_usernames = []
-    losing_cards = []
-    for seat in losing_seats:
-        losing_usernames.append(state.table[seat][0])
-        if len(table[seat]) > 1:
-            losing_cards.append(table[seat][1])
-        else:
-            losing_cards.append(table[seat][0])
-        lives = state.table[seat][1]
-        state.table[seat][1] = lives - 1
-
-    time.sleep(3)
-
-    broadcast(state, f"LOSERS:{create_list_string(losing_usernames)}:{create_list_string(losing_cards)}\n")
-
-    time.sleep(3)
-
-    round_result = players_left(state)
-    
-    if round_result == 1: # more than 1 player left
-        return 1
-    elif round_result == 0: # only 1 player left
-        return 0
-    else: # players with 1 life left tied: therefore they don't lose a life and the game continues
-        for seat in losing_seats:
-            lives = state.table[seat][1]
-            state.table[seat][1] = lives + 1
-        return -1
+            if seat in hands:
+                send_message(conn, "DEAL", flip_order_string, NAMES[hands[seat][0]])
+            else:
+                send_message(conn, "DEAL", flip_order_string, "NONE")
+        print(hand_strs(hands))
+    elif kind == "flip":
+        broadcast(state, "FLIP_CARD", event[1], NAMES[event[2]])
+    elif kind == "decision":
+        return get_player_action(state, event[1], state.playerConnections[event[1]], NAMES[event[2]])
+    elif kind == "new_card":
+        send_message(state.playerConnections[event[1]], "NEW_CARD", NAMES[event[2]])
+    elif kind == "action":
+        broadcast(state, "PLAYER_ACTION", event[1], event[2])
+    elif kind == "reveal":
+        _, flip_order, hands = event
+        print(hand_strs(hands))
+        broadcast(state, "REVEAL", create_list_string(flip_order), json.dumps(hand_strs(hands)))
+    elif kind == "losers":
+        _, losing_seats, losing_cards = event
+        losing_usernames = [state.table[seat][0] for seat in losing_seats]
+        broadcast(state, "LOSERS", create_list_string(losing_usernames), create_list_string([NAMES[card] for card in losing_cards]))
 
 def runGame(state):
-    game_over = False
-
     print("TABLE", state.table)
 
-    table_json = json.dumps(state.table).encode()
-    broadcast(state, f"TABLE:{len(table_json)}\n")
-    time.sleep(0.1)
-    broadcast(state, table_json)
-
-    order = generate_flip_order(state)
-
-    deck = create_shuffled_deck()
-    print(deck)
-    while not game_over:
-        print(f"deck size {len(deck)}")
-        if state.table[state.dealer][1] == 0:
-            new_dealer(state)
-
-            if len(deck) < (state.playerCount + 1):
-                print("NEW DECK")
-                deck = create_shuffled_deck()
-
-            table_json = json.dumps(state.table).encode()
-            broadcast(state, f"TABLE:{len(table_json)}\n")
-            time.sleep(0.1)
-            broadcast(state, table_json)
-            time.sleep(2)
-
-        elif len(deck) < (state.playerCount + 1):
-            deck = create_shuffled_deck()
-            print("NEW DECK")
-            new_dealer(state)
-
-            table_json = json.dumps(state.table).encode()
-            broadcast(state, f"TABLE:{len(table_json)}\n")
-            time.sleep(0.1)
-            broadcast(state, table_json)
-            time.sleep(2)
-
-        flip_order = generate_flip_order(state)
-        result = play_round(state, deck, order, flip_order)
-
-        if result == 0:
-            game_over = True
+    state.deck.new_game()
+    recorder = GameRecorder(state.log, state) if state.log is not None else None
+    events = game_events(state) if recorder is None else game_events(state, recorder.new_deck)
+    decision = None
+    while True:
+        try:
+            event = events.send(decision)
+        except StopIteration as done:
             state.gameRunning = False
-            winner = state.table[generate_flip_order(state)[0]][0]
-            return winner
-        else:
-            table_json = json.dumps(state.table).encode()
-            broadcast(state, f"TABLE:{len(table_json)}\n")
-            time.sleep(0.1)
-            broadcast(state, table_json)
-            time.sleep(2)
-
-port = int(sys.argv[1])
+            update_view(state)
+            if recorder is not None:
+                recorder.end(done.value)
+            GAMES.inc()
+            return done.value
+        serveCommands(state)
+        start = time.perf_counter()
+        decision = play_event(state, event)
+        if recorder is not None:
+            recorder.event(event, decision, time.perf_counter() - start)
+
+parser = argparse.ArgumentParser()
+parser.add_argument("port", type=int)
+parser.add_argument("--pacing", choices=PROFILES, default="normal")
+parser.add_argument("--decision-timeout", type=float, help="seconds a player has to keep or switch")
+parser.add_argument("--event-log", help="record every game to this file, see eventlog.py")
+parser.add_argument("--metrics-port", type=int, help="serve Prometheus metrics on this port at /metrics")
+parser.add_argument("--seed", type=int, help="seed the decks, for a reproducible run")
+args = parser.parse_args()
+port = args.port
 
 listener = socket(AF_INET, SOCK_STREAM)
 listener.setsockopt(SOL_SOCKET, SO_REUSEADDR, 1)
@@ -428,69 +385,57 @@ listener.bind(('', port))
 listener.listen(32)
 
 state = GameState()
+state.commands = queue.SimpleQueue()
+state.deck = Deck(args.seed)
+state.pacing = PROFILES[args.pacing]
+if args.decision_timeout is not None:
+    state.pacing = state.pacing.with_decision_timeout(args.decision_timeout)
+if args.event_log is not None:
+    state.log = EventLog(args.event_log)
+if args.metrics_port is not None:
+    PLAYERS.set_function(lambda: state.view.players)
+    TABLES.set_function(lambda: 1)
+    ACCEPT_QUEUE.set_function(lambda: accept_queue_depth(listener))
+    serve(args.metrics_port)
 running = True
 
-startTime = 0.0
-
 # Start listening for players
 threading.Thread(target=listenForPlayers, args=(state, listener), daemon=True).start()
 
-INBETWEEN_ROUND_TIME = 30
-
 try:
     while running:
         try:
-            if state.gameRunning:
+            if state.lobby.phase == RUNNING:
                 winner = runGame(state)
+                state.lobby.game_over()
                 print("Game over")
                 # broadcast table message of who won
 
-                table_json = json.dumps(state.table).encode()
-                broadcast(state, f"TABLE:{len(table_json)}\n")
-                time.sleep(0.1)
-                broadcast(state, table_json)
-                time.sleep(0.1)
-                broadcast(state, f"WAITING:Gamer Over - {winner} wins\n")
-                time.sleep(3)
+                broadcastTable(state)
+                broadcast(state, "WAITING", f"Gamer Over - {winner} wins")
+                pause(state, "game_over")
 
                 # reset table state 
                 reset_lives(state)
                 #new_dealer()
                 
                 # send new table info
-                table_json = json.dumps(state.table).encode()
-                broadcast(state, f"TABLE:{len(table_json)}\n")
-                time.sleep(0.1)
-                broadcast(state, table_json)
-                with state.lock:
-                    state.gameRunning = False
-            elif state.playerCount > 1 and not state.startGameThreadRunning:
-                with state.lock:
-                    state.startGameThreadRunning = True
-                    threading.Timer(INBETWEEN_ROUND_TIME, startGame, args=(state,)).start()
-                startTime = time.time()
-                #broadcast(state, f"WAITING:Game will begin in %0.0f\n" %(INBETWEEN_ROUND_TIME - (time.time() - startTime)))
-                broadcast(state, f"WAITING:Game will begin in {int(INBETWEEN_ROUND_TIME - (time.time() - startTime)):02}\n")
-                print("Game will begin in %0.0f seconds\n" %(INBETWEEN_ROUND_TIME - (time.time() - startTime)))
-            elif state.startGameThreadRunning and not state.cancelCountdown:
-                broadcast(state, f"WAITING:Game will begin in {int(INBETWEEN_ROUND_TIME - (time.time() - startTime)):02}\n")
-            elif state.playerCount == 1:
-                broadcast(state, f"WAITING:Waiting for more players to join\n")
-            time.sleep(1)
+                broadcastTable(state)
+                say(state, state.lobby.reopen(state.playerCount, state.pacing.delay("countdown"), time.time()))
+            else:
+                waitInLobby(state)
         except (BrokenPipeError, ConnectionResetError):
             handleDisconnect(state)
-            reset_lives(state)
             print("Current table:", state.table)
             # Notify remaining players
             print(f"player count {state.playerCount}")
             if state.playerCount > 0:
-                table_json = json.dumps(state.table).encode()
-                broadcast(state, f"TABLE:{len(table_json)}\n")
-                time.sleep(0.1)
-                broadcast(state, table_json)
-            time.sleep(1)
-            broadcast(state, f"WAITING:Player disconnected - ended game\n")
-            time.sleep(3)
+                reset_lives(state)
+                broadcastTable(state)
+            pause(state, "disconnect")
+            broadcast(state, "WAITING", "Player disconnected - ended game")
+            pause(state, "disconnect_notice")
+            say(state, state.lobby.reopen(state.playerCount, state.pacing.delay("countdown"), time.time()))
 except KeyboardInterrupt:
     print("\n[Shutting down]")
     running = False
@@ -500,3 +445,5 @@ finally:
     listener.close()
     for conn in state.playerConnections.values():
         conn.close()
+    if state.log is not None:
+        state.log.close()
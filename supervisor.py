@@ -0,0 +1,67 @@
+import sys
+import time
+import signal
+import multiprocessing
+import multiprocessing.connection
+from socket import *
+
+# Runs several server worker processes on one port so a box can use all of
+# its cores (one Python process only ever runs game logic on one).
+#
+# On Linux every worker binds its own socket with SO_REUSEPORT and the
+# kernel spreads new connections across them. Elsewhere the supervisor
+# binds one socket before forking and all workers accept from it.
+# Workers that die are restarted; the others keep their tables running.
+
+RESTART_DELAY = 1
+
+def reuse_port_supported():
+    return "SO_REUSEPORT" in globals() and sys.platform.startswith("linux")
+
+def interrupt(signum, frame):
+    raise KeyboardInterrupt
+
+def listen_socket(port, backlog, reusePort=False):
+    sock = socket(AF_INET, SOCK_STREAM)
+    sock.setsockopt(SOL_SOCKET, SO_REUSEADDR, 1)
+    if reusePort:
+        sock.setsockopt(SOL_SOCKET, SO_REUSEPORT, 1)
+    sock.bind(('', port))
+    sock.listen(backlog)
+    return sock
+
+def supervise(workers, target, port, backlog, *args):
+    # target(workerId, sock, *args) runs in each worker. sock is the shared
+    # listener, or None when the worker should bind its own with
+    # listen_socket(port, backlog, reusePort=True).
+    context = multiprocessing.get_context("fork")
+    shared = None if reuse_port_supported() else listen_socket(port, backlog)
+    mode = "SO_REUSEPORT" if shared is None else "shared listener"
+    print(f"Starting {workers} workers on port {port} ({mode})")
+
+    def start(workerId):
+        process = context.Process(target=target, args=(workerId, shared) + args, daemon=True)
+        process.start()
+        return process
+
+    # SIGTERM shuts down the same way as Ctrl-C (workers inherit this too)
+    signal.signal(signal.SIGTERM, interrupt)
+    processes = {workerId: start(workerId) for workerId in range(workers)}
+    try:
+        while True:
+            sentinels = {process.sentinel: workerId for workerId, process in processes.items()}
+            for sentinel in multiprocessing.connection.wait(list(sentinels)):
+                workerId = sentinels[sentinel]
+                processes[workerId].join()
+                print(f"Worker {workerId} exited with {processes[workerId].exitcode}, restarting")
+                time.sleep(RESTART_DELAY)
+                processes[workerId] = start(workerId)
+    except KeyboardInterrupt:
+        print("\n[Shutting down workers]")
+    finally:
+        for process in processes.values():
+            process.terminate()
+        for process in processes.values():
+            process.join()
+        if shared is not None:
+            shared.close()
@@ -0,0 +1,98 @@
+import asyncio
+from game import *
+
+# Many independent tables inside one asyncio server process. Each table is
+# its own GameState with its own dealer rotation, deck, lobby and game
+# loop task; the manager only decides where new players sit.
+
+MAX_SEATS = 6
+RESUME_GRACE = 30   # seconds a dropped player's seat is held mid-game
+
+class Table(GameState):
+    def __init__(self, tableId):
+        super().__init__()
+        self.id = tableId
+        self.changed = asyncio.Event()  # set on joins and leaves, wakes runTable's lobby
+        self.task = None            # task running this table's game loop
+        self.closed = False
+        self.tokens = {}            # resume token -> seat
+        self.resumeGrace = RESUME_GRACE
+        self.spectators = set()     # watching connections, see async_server.fanOut
+        self.joining = []           # spectators waiting for their SNAPSHOT
+        self.feed = []              # framed messages not yet sent to spectators
+        self.feedReady = asyncio.Event()
+        self.fanOut = None          # task sending the feed, started by the first spectator
+
+class TableManager:
+    def __init__(self, runTable, maxTables=None, pacing=NORMAL, resumeGrace=RESUME_GRACE, log=None, seed=None):
+        self.runTable = runTable    # coroutine function driving one table
+        self.maxTables = maxTables
+        self.pacing = pacing        # profile given to newly opened tables
+        self.resumeGrace = resumeGrace
+        self.log = log              # EventLog shared by every table, or None
+        self.seed = seed            # tables' decks are seeded from it and their id, if given
+        self.tables = {}            # id -> Table
+        self.nextId = 0
+        self.tournament = None      # tournament.Tournament placing the players instead, if any
+
+    def open_table(self):
+        table = self.new_table()
+        table.task = asyncio.get_running_loop().create_task(self.runTable(self, table))
+        print(f"[table {table.id}] opened ({len(self.tables)} tables)")
+        return table
+
+    def new_table(self):
+        # a table with nothing running it yet
+        table = Table(self.nextId)
+        table.pacing = self.pacing
+        table.resumeGrace = self.resumeGrace
+        table.log = self.log
+        if self.seed is not None:
+            table.deck = Deck(f"{self.seed}:{table.id}")
+        self.nextId += 1
+        self.tables[table.id] = table
+        return table
+
+    def close_table(self, table):
+        # called from the table's own loop once everyone has left
+        table.closed = True
+        if self.tables.get(table.id) is table:
+            del self.tables[table.id]
+            print(f"[table {table.id}] closed ({len(self.tables)} tables)")
+
+    def find_table(self):
+        # Fill the fullest table still waiting for players so games start
+        # sooner; only open a new table when every waiting one is full
+        best = None
+        for table in self.tables.values():
+            if table.gameRunning or table.closed or table.playerCount >= MAX_SEATS:
+                continue
+            if best is None or table.playerCount > best.playerCount:
+                best = table
+        if best is not None:
+            return best, None
+        if self.maxTables is not None and len(self.tables) >= self.maxTables:
+            running = any(table.gameRunning for table in self.tables.values())
+            return None, "GAME_RUNNING" if running else "TABLE_FULL"
+        return self.open_table(), None
+
+    def find_watch_table(self, tableId=None):
+        # The table a spectator asked for, or else the one with the most
+        # players, preferring tables with a game running. None if there is none.
+        if tableId is not None:
+            table = self.tables.get(tableId)
+            return None if table is None or table.closed else table
+        tables = [table for table in self.tables.values() if not table.closed]
+        if not tables:
+            return None
+        return max(tables, key=lambda table: (table.gameRunning, table.playerCount))
+
+    def find_seat(self, token):
+        # -> (table, seat) holding a resume token, or (None, None)
+        for table in self.tables.values():
+            if token in table.tokens:
+                return table, table.tokens[token]
+        return None, None
+
+    def player_count(self):
+        return sum(table.playerCount for table in self.tables.values())
@@ -0,0 +1,56 @@
+import asyncio
+from async_server import *
+
+class FakeTransport:
+    def __init__(self):
+        self.aborted = False
+
+    def get_write_buffer_size(self):
+        return 0
+
+    def abort(self):
+        self.aborted = True
+
+class FakeWriter:
+    def __init__(self):
+        self.transport = FakeTransport()
+        self.sent = []
+
+    def write(self, data):
+        self.sent.append(data)
+
+    def close(self):
+        pass
+
+def test_seated_tournament_player_is_not_dropped_for_waiting():
+    async def run():
+        loop = asyncio.get_running_loop()
+        manager = TableManager(runTable)
+        conn = PlayerConn(None, FakeWriter())
+        conn.version = FRAMED
+        conn.username = "waited"
+        # registered long before the tournament started, never pinged
+        conn.lastSeen = loop.time() - LIVENESS_TIMEOUT * 2
+        conn.pingSent = loop.time() - LIVENESS_TIMEOUT * 2
+        state = manager.new_table()
+        seatPlayer(state, conn)
+        checkLiveness(manager, loop.time(), LIVENESS_TIMEOUT)
+        assert not conn.writer.transport.aborted
+        assert conn.pingSent is not None    # pinged on this tick instead
+    asyncio.run(run())
+
+def test_waiting_tournament_players_are_pinged():
+    async def run():
+        loop = asyncio.get_running_loop()
+        manager = TableManager(runTable)
+        manager.tournament = Tournament(2, lambda entry: None, lambda champion: None)
+        alive = PlayerConn(None, FakeWriter())
+        dead = PlayerConn(None, FakeWriter())
+        for conn in (alive, dead):
+            conn.version = FRAMED
+            manager.tournament.register(conn)
+        dead.lastSeen = loop.time() - LIVENESS_TIMEOUT * 2
+        checkLiveness(manager, loop.time(), LIVENESS_TIMEOUT)
+        assert alive.pingSent is not None and not alive.writer.transport.aborted
+        assert dead.writer.transport.aborted
+    asyncio.run(run())
@@ -0,0 +1,44 @@
+import random
+from engine import *
+
+def deciders(seed):
+    # the same random keep/switch choices every run for one seed
+    rng = random.Random(seed)
+    return {seat: (lambda card: rng.choice(["keep", "switch"])) for seat in range(6)}
+
+def play(seed):
+    state = new_game(["ann", "bob", "cat", "dan"], seed=seed)
+    return simulate_game(state, deciders(seed)), state
+
+def test_simulate_game_ends_with_one_player_alive():
+    for seed in range(50):
+        winner, state = play(seed)
+        alive = [entry[0] for entry in state.table.values() if entry[1] > 0]
+        assert alive == [winner]
+
+def test_same_seed_plays_the_same_game():
+    for seed in range(10):
+        first, firstState = play(seed)
+        second, secondState = play(seed)
+        assert first == second
+        assert firstState.deck.seed == secondState.deck.seed
+        assert [entry[1] for entry in firstState.table.values()] == [entry[1] for entry in secondState.table.values()]
+
+def test_deck_replays_a_game_from_its_seed():
+    deck = Deck(7)
+    seed = deck.new_game()
+    played = [list(deck.shuffle().cards) for i in range(3)]
+    replay = Deck()
+    assert replay.new_game(seed) == seed
+    assert [list(replay.shuffle().cards) for i in range(3)] == played
+
+def test_table_seed_hands_out_the_same_game_seeds():
+    assert [Deck(3).new_game() for i in range(2)] == [Deck(3).new_game()] * 2
+    deck = Deck(3)
+    assert deck.new_game() != deck.new_game()
+
+def test_shuffle_keeps_the_whole_deck():
+    deck = Deck(1).shuffle()
+    assert len(deck) == 52
+    assert sorted(deck.pop() for i in range(52)) == sorted(DECK)
+    assert len(deck) == 0
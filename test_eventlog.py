@@ -0,0 +1,85 @@
+from engine import *
+from eventlog import *
+
+def record_game(log, state, decide=lambda card: "keep"):
+    # plays state to the end through a GameRecorder -> the recorder
+    recorder = GameRecorder(log, state)
+    state.deck.new_game()
+    events = game_events(state, recorder.new_deck)
+    decision = None
+    try:
+        while True:
+            event = events.send(decision)
+            decision = decide(event[2]) if event[0] == "decision" else None
+            recorder.event(event, decision)
+    except StopIteration as done:
+        recorder.end(done.value)
+    return recorder
+
+def test_big_table_ids_are_logged(tmp_path):
+    path = tmp_path / "games.log"
+    log = EventLog(path)
+    state = new_game(["ann", "bob"], seed=1)
+    state.id = 70000
+    record_game(log, state)
+    log.close()
+    start = next(payload for offset, game, t, kind, payload in records(path) if kind == GAME_START)
+    assert parse_start(start)[2] == 70000
+
+def test_records_stop_at_a_record_cut_short(tmp_path):
+    path = tmp_path / "games.log"
+    log = EventLog(path)
+    record_game(log, new_game(["ann", "bob"], seed=2))
+    log.close()
+    whole = list(records(path))
+    with open(path, "ab") as f:
+        f.write(HEADER.pack(whole[0][1], 1.0, LIVES, 2) + b"\x00")   # one payload byte short
+    assert list(records(path)) == whole
+
+def test_reopening_drops_a_record_cut_short(tmp_path):
+    path = tmp_path / "games.log"
+    log = EventLog(path)
+    record_game(log, new_game(["ann", "bob"], seed=3))
+    log.close()
+    size = os.path.getsize(path)
+    with open(path, "ab") as f:
+        f.write(HEADER.pack(0, 1.0, LIVES, 2)[:5])      # a crash mid-header
+    log = EventLog(path)
+    assert os.path.getsize(path) == size
+    record_game(log, new_game(["cy", "dee"], seed=4))
+    log.close()
+    starts = [parse_start(payload)[4] for offset, game, t, kind, payload in records(path) if kind == GAME_START]
+    assert [sorted(name for name, lives in seats.values()) for seats in starts] == [["ann", "bob"], ["cy", "dee"]]
+    assert sum(1 for record in records(path) if record[3] == GAME_END) == 2
+
+def test_switches_stopped_by_a_king_are_not_counted_as_switches(tmp_path):
+    path = tmp_path / "games.log"
+    log = EventLog(path)
+    for seed in range(20):
+        record_game(log, new_game(["ann", "bob", "cy", "dee"], seed=seed), lambda card: "switch")
+    log.close()
+    outcomes = []
+    pendingSwitch = {}      # game -> seat of the last SWITCH not yet matched to its DECISION
+    for offset, game, t, kind, payload in records(path):
+        if kind == SWITCH:
+            pendingSwitch[game] = payload[0]
+        elif kind == DECISION:
+            seat, card, switched, timedOut, latency = DECISION_RECORD.unpack(payload)
+            assert (switched == SWITCHED) == (pendingSwitch.pop(game, None) == seat)
+            outcomes.append(switched)
+    assert KING_BLOCKED in outcomes and SWITCHED in outcomes and KEPT not in outcomes
+
+def test_records_of_a_log_shorter_than_its_header(tmp_path):
+    path = tmp_path / "games.log"
+    for data in (b"", MAGIC[:3], MAGIC, MAGIC + HEADER.pack(1, 1.0, LIVES, 2)[:5]):
+        path.write_bytes(data)
+        assert list(records(path)) == []
+
+def test_records_refuse_a_file_that_is_not_an_event_log(tmp_path):
+    path = tmp_path / "games.log"
+    path.write_bytes(b"NOTALOG!" + bytes(20))
+    try:
+        list(records(path))
+    except ValueError:
+        return
+    assert False, "expected ValueError"
@@ -0,0 +1,39 @@
+from lobby import *
+
+def test_countdown_starts_with_the_second_player():
+    lobby = Lobby()
+    assert lobby.players_changed(1, 10, 0) == WAITING_FOR_PLAYERS
+    assert lobby.phase == WAITING and lobby.timeout(0) is None
+    assert lobby.players_changed(2, 10, 0) == "Game will begin in 10"
+    assert lobby.phase == COUNTDOWN
+    # a third player doesn't restart the countdown
+    assert lobby.players_changed(3, 10, 4) == "Game will begin in 06"
+    assert lobby.deadline == 10
+
+def test_countdown_ticks_once_a_second_then_runs():
+    lobby = Lobby()
+    lobby.players_changed(2, 3, 0)
+    assert lobby.timeout(0) == 1
+    assert abs(lobby.timeout(0.25) - 0.75) < 1e-9
+    assert lobby.tick(0.5) is None             # still shows 03
+    assert lobby.tick(1) == "Game will begin in 02"
+    assert lobby.tick(3) is None
+    assert lobby.phase == RUNNING and lobby.timeout(3) is None
+
+def test_down_to_one_player_goes_back_to_waiting():
+    lobby = Lobby()
+    lobby.players_changed(2, 10, 0)
+    assert lobby.players_changed(1, 10, 2) == WAITING_FOR_PLAYERS
+    assert lobby.phase == WAITING and lobby.deadline is None
+    assert lobby.tick(20) is None and lobby.phase == WAITING
+    assert lobby.players_changed(0, 10, 3) is None
+
+def test_joins_during_a_game_are_ignored_until_reopen():
+    lobby = Lobby()
+    lobby.players_changed(2, 1, 0)
+    lobby.tick(1)
+    assert lobby.players_changed(3, 1, 2) is None and lobby.phase == RUNNING
+    lobby.game_over()
+    assert lobby.players_changed(1, 1, 3) is None and lobby.phase == GAME_OVER
+    assert lobby.reopen(3, 5, 4) == "Game will begin in 05"
+    assert lobby.phase == COUNTDOWN and lobby.deadline == 9
@@ -0,0 +1,51 @@
+import time
+from socket import socketpair
+from netio import BufferedConn
+from protocol import *
+
+def test_negotiate():
+    assert negotiate("alice") == (TEXT, "alice", None)
+    assert negotiate("HELLO:1:bob") == (TEXT, "bob", None)
+    assert negotiate("HELLO:2:carol") == (FRAMED, "carol", None)
+    assert negotiate("HELLO:99:dee:with:colons") == (PROTOCOL_VERSION, "dee:with:colons", None)
+    assert negotiate("RESUME:2:abc123") == (FRAMED, None, "abc123")
+    assert negotiate("RESUME:1:abc123")[0] == FRAMED     # resumes are always framed
+
+def test_negotiate_rejects_a_bad_version():
+    try:
+        negotiate("HELLO:x:name")
+    except ValueError:
+        return
+    assert False, "expected ValueError"
+
+def test_every_hello_is_greeted():
+    assert greeted("HELLO:1:bob") and greeted("RESUME:2:abc") and greeted("WATCH:2:")
+    assert not greeted("alice")
+
+def test_round_trip():
+    for version in (TEXT, FRAMED):
+        server, client = socketpair()
+        conn = BufferedConn(server)
+        conn.version = version
+        for msgType, fields in (("ACTION", ["switch"]), ("ACK", []), ("RESYNC", [])):
+            client.sendall(encode(version, msgType, *fields))
+            assert read_message(conn) == (msgType, fields)
+        client.close()
+        assert read_message(conn) == (None, [])
+        server.close()
+
+def test_half_a_frame_does_not_block_past_the_deadline():
+    for version in (TEXT, FRAMED):
+        server, client = socketpair()
+        conn = BufferedConn(server)
+        conn.version = version
+        data = encode(version, "ACTION", "switch")
+        client.sendall(data[:-2])
+        start = time.time()
+        assert read_message_by(conn, start + 0.2) is None
+        assert time.time() - start < 1
+        client.sendall(data[-2:])
+        assert read_message_by(conn, time.time() + 1) == ("ACTION", ["switch"])
+        client.close()
+        assert read_message_by(conn, time.time() + 1) == (None, [])
+        server.close()
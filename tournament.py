@@ -0,0 +1,178 @@
+import math
+import time
+from collections import deque
+from tables import MAX_SEATS
+
+# Knockout tournament played on many tables at once. The registered players
+# are split over round 1's tables; each table's winner moves on to round 2,
+# and so on until one player is left.
+#
+# Rounds don't wait for each other. How many players a round will have is
+# known ahead (one per table of the round before), so its tables are sized
+# up front, as evenly as possible (16 players sit 6, 5, 5 rather than
+# 6, 6, 4), and a table starts as soon as enough winners have arrived to
+# fill it, while the rest of the round before is still playing. A round
+# with one player over gives them a bye. With maxTables, tables that are
+# ready wait for a free one, oldest first.
+#
+# The scheduler only decides who sits where and when. The server plays each
+# table it is handed (see async_server.playTournamentTable) and reports the
+# winner back with table_done.
+
+def table_sizes(players):
+    # players split over as few tables as possible, biggest first
+    if players <= 0:
+        return []
+    tables = math.ceil(players / MAX_SEATS)
+    small, extra = divmod(players, tables)
+    return [small + 1] * extra + [small] * (tables - extra)
+
+class TournamentTable:
+    def __init__(self, round, players, arrived, formed):
+        self.round = round
+        self.players = players
+        self.arrived = arrived      # clock time the first of them was ready to play
+        self.formed = formed        # clock time its last seat was filled
+        self.started = None
+        self.finished = None
+        self.winner = None
+        self.tableId = None         # the server's id for the table it plays on
+
+    def waited(self):
+        # from its first player being ready to the game starting
+        return self.started - self.arrived
+
+class TournamentRound:
+    def __init__(self, number):
+        self.number = number
+        self.waiting = []           # (player, clock time they got here), seated in that order
+        self.seated = 0             # players given a table or a bye
+        self.tables = []            # TournamentTables formed so far
+        self.byes = 0
+        self.done = 0               # tables finished
+        self.empty = 0              # tables finished with nobody left to win
+
+class Tournament:
+    def __init__(self, size, startTable, endTournament, maxTables=None, name=str, clock=time.monotonic):
+        self.size = size                    # players to register before round 1
+        self.startTable = startTable        # startTable(table) plays it -> the server's table id
+        self.endTournament = endTournament  # endTournament(champion), None if everyone left
+        self.maxTables = maxTables          # tables playing at once, None = no limit
+        self.name = name                    # player -> name for the reports
+        self.clock = clock
+        self.players = []                   # registered
+        self.rounds = []                    # TournamentRound, rounds[0] is round 1
+        self.ready = deque()                # tables formed, waiting for a free one
+        self.playing = 0
+        self.started = None
+        self.finished = None
+        self.champion = None
+
+    def register(self, player):
+        # -> True once enough players have registered to start
+        self.players.append(player)
+        return len(self.players) >= self.size
+
+    def start(self):
+        now = self.clock()
+        self.started = now
+        print(f"[tournament] {len(self.players)} players, {len(table_sizes(len(self.players)))} tables in round 1")
+        self.round(1).waiting = [(player, now) for player in self.players]
+        self.schedule(1)
+
+    def round(self, number):
+        while len(self.rounds) < number:
+            self.rounds.append(TournamentRound(len(self.rounds) + 1))
+        return self.rounds[number - 1]
+
+    def entrants(self, number):
+        # players round number will have, as far as is known now
+        if number == 1:
+            return len(self.players)
+        before = self.round(number - 1)
+        unseated = self.entrants(number - 1) - before.seated
+        return len(before.tables) + before.byes - before.empty + len(table_sizes(unseated))
+
+    def schedule(self, number):
+        # give whoever is waiting in round number a table, as long as there
+        # are enough of them to fill the next one
+        current = self.round(number)
+        while current.waiting and self.champion is None:
+            if number > 1 and self.entrants(number) == 1:
+                self.finish(current.waiting[0][0])
+                return
+            sizes = table_sizes(self.entrants(number) - current.seated)
+            if not sizes or len(current.waiting) < sizes[0]:
+                break
+            seated, current.waiting = current.waiting[:sizes[0]], current.waiting[sizes[0]:]
+            current.seated += len(seated)
+            players = [player for player, arrived in seated]
+            if len(players) == 1:
+                current.byes += 1
+                print(f"[tournament] round {number}: bye for {self.name(players[0])}")
+                self.advance(players[0], number + 1)
+                continue
+            table = TournamentTable(number, players, min(arrived for player, arrived in seated), self.clock())
+            current.tables.append(table)
+            self.ready.append(table)
+        self.dispatch()
+
+    def dispatch(self):
+        while self.ready and (self.maxTables is None or self.playing < self.maxTables):
+            table = self.ready.popleft()
+            table.started = self.clock()
+            self.playing += 1
+            table.tableId = self.startTable(table)
+
+    def advance(self, player, number):
+        self.round(number).waiting.append((player, self.clock()))
+        self.schedule(number)
+
+    def table_done(self, table, winner):
+        # The server has finished playing table. winner is None if every
+        # player at it left
+        now = self.clock()
+        table.finished = now
+        table.winner = winner
+        self.playing -= 1
+        current = self.round(table.round)
+        current.done += 1
+        result = "nobody left" if winner is None else f"{self.name(winner)} wins"
+        print(f"[tournament] round {table.round} table {table.tableId}: {len(table.players)} players, "
+              f"waited {table.waited():.2f}s, played {now - table.started:.2f}s, {result}")
+        self.progress(current)
+        if winner is not None:
+            self.advance(winner, table.round + 1)
+        else:
+            # the rounds after are a player short, which may leave whoever
+            # is waiting there enough for a table (or the title)
+            current.empty += 1
+            for number in range(table.round + 1, len(self.rounds) + 1):
+                self.schedule(number)
+        if self.champion is None and not self.playing and not self.ready:
+            self.finish(None)
+        else:
+            self.dispatch()
+
+    def progress(self, current):
+        planned = len(current.tables) + len(table_sizes(self.entrants(current.number) - current.seated))
+        playing = sum(1 for table in current.tables if table.started is not None and table.finished is None)
+        print(f"[tournament] round {current.number}: {current.done}/{planned} tables done, "
+              f"{playing} playing, {len(current.waiting)} players waiting")
+        if current.done == planned:
+            waits = [table.waited() for table in current.tables]
+            began = min(table.started for table in current.tables)
+            print(f"[tournament] round {current.number} done in {self.clock() - began:.1f}s, "
+                  f"table wait mean {sum(waits) / len(waits):.2f}s, max {max(waits):.2f}s")
+
+    def finish(self, champion):
+        self.champion = champion
+        self.finished = self.clock()
+        tables = [table for current in self.rounds for table in current.tables]
+        rounds = sum(1 for current in self.rounds if current.tables)
+        waits = [table.waited() for table in tables if table.started is not None] or [0]
+        winner = "nobody" if champion is None else self.name(champion)
+        print(f"[tournament] {winner} wins: {len(self.players)} players, {rounds} rounds, "
+              f"{len(tables)} tables in {self.finished - self.started:.1f}s, "
+              f"table wait mean {sum(waits) / len(waits):.2f}s, max {max(waits):.2f}s")
+        self.endTournament(champion)
@@ -1,11 +1,123 @@
 import curses
+import functools
+import os
+import signal
 import time
 
 CARD_DELAY = 0.5
+FRAME_DELAY = 0.1
 
 
 BOX_HEIGHT = 10
 BOX_WIDTH = 60
+CARD_HEIGHT = 5
+CARD_WIDTH = 7
+
+# Drawing works in regions instead of repainting the screen: the layout for
+# the current terminal size is computed once (and again after SIGWINCH),
+# card glyphs are built once, every helper remembers which regions it drew
+# on, and draw_table only blanks those regions and rewrites the seat labels
+# that changed. Helpers stage their output with noutrefresh() and send it
+# with one doupdate() per frame, so curses only transmits the cells that
+# actually differ.
+
+class Layout:
+    def __init__(self, max_y, max_x):
+        self.size = (max_y, max_x)
+        self.box_top = (max_y - BOX_HEIGHT) // 2
+        self.box_left = (max_x - BOX_WIDTH) // 2
+        center_x = self.box_left + BOX_WIDTH // 2
+        center_y = self.box_top + BOX_HEIGHT // 2
+
+        spacing_x = 20
+        spacing_y = 8
+
+        self.positions = {
+            0: (center_y-3, self.box_left - 16),                        # Far left
+            1: (self.box_top - spacing_y, center_x - spacing_x),        # Top-left
+            2: (self.box_top - spacing_y, center_x + spacing_x),        # Top-right
+            3: (center_y-3, self.box_left + BOX_WIDTH + 16),            # Far right
+            4: (self.box_top + BOX_HEIGHT + 2, center_x + spacing_x),   # Bottom-right
+            5: (self.box_top + BOX_HEIGHT + 2, center_x - spacing_x),   # Bottom-left
+        }
+
+        # a card centered in the table box, and the prompt line under it
+        self.card_y = self.box_top + (BOX_HEIGHT - CARD_HEIGHT) // 2
+        self.card_x = self.box_left + (BOX_WIDTH - CARD_WIDTH) // 2
+        self.prompt_y = self.card_y + CARD_HEIGHT + 1
+        self.message_y = self.box_top + 4
+
+        # regions as (top, left, height, width)
+        self.interior = (self.box_top + 1, self.box_left + 1, BOX_HEIGHT - 2, BOX_WIDTH - 2)
+        self.seat_cards = {
+            # dealt/flipped/revealed cards and the action line under a seat
+            seat: (y + 1, x - 12, 7, 25) for seat, (y, x) in self.positions.items()
+        }
+        self.banner = (2, 0, CARD_HEIGHT + 2, max_x)   # losers message and cards
+
+class Screen:
+    # what is on the terminal right now
+    def __init__(self, layout):
+        self.layout = layout
+        self.dirty = set()      # regions drawn on since the last draw_table
+        self.labels = {}        # seat -> (text, attr, y, x) of the drawn label
+
+_screen = None
+_resized = False
+_pause = time.sleep
+_players = {}   # last table given to draw_table, repainted after a resize
+
+def _on_resize(signum, frame):
+    global _resized
+    _resized = True
+
+def screen(stdscr):
+    # The Screen for the current terminal size. A new size starts from a
+    # blank screen with the table box drawn.
+    global _screen, _resized
+    if _screen is None and hasattr(signal, "SIGWINCH"):
+        signal.signal(signal.SIGWINCH, _on_resize)
+    if _resized:
+        _resized = False
+        size = os.get_terminal_size()
+        curses.resizeterm(size.lines, size.columns)
+    max_y, max_x = stdscr.getmaxyx()
+    if _screen is None or _screen.layout.size != (max_y, max_x):
+        _screen = Screen(Layout(max_y, max_x))
+        stdscr.erase()
+        draw_center_box(stdscr)
+        for seat, (name, lives, isDealer) in _players.items():
+            draw_player_label(stdscr, seat, name, lives, isDealer)
+    return _screen
+
+def set_pause(wait):
+    # wait(seconds) is used for every animation delay; player.py passes one
+    # that returns early when more messages are waiting, which fast-forwards
+    # whatever is left of the animation
+    global _pause
+    _pause = wait
+
+def pause(seconds):
+    _pause(seconds)
+
+def update(stdscr):
+    # send one frame to the terminal
+    stdscr.noutrefresh()
+    curses.doupdate()
+
+def erase_region(stdscr, region):
+    top, left, height, width = region
+    max_y, max_x = stdscr.getmaxyx()
+    left, right = max(left, 0), min(left + width, max_x)
+    if right <= left:
+        return
+    blank = " " * (right - left)
+    for y in range(max(top, 0), min(top + height, max_y)):
+        if y == max_y - 1 and right == max_x:
+            # curses can't write the bottom-right cell without scrolling
+            stdscr.insstr(y, left, blank)
+        else:
+            stdscr.addstr(y, left, blank)
 
 def flush_input_curses(stdscr):
     stdscr.nodelay(True)
@@ -14,78 +126,56 @@ def flush_input_curses(stdscr):
     stdscr.nodelay(False)
 
 def get_player_positions(stdscr):
-    max_y, max_x = stdscr.getmaxyx()
-    box_top = (max_y - BOX_HEIGHT) // 2
-    box_left = (max_x - BOX_WIDTH) // 2
-    center_x = box_left + BOX_WIDTH // 2
-    center_y = box_top + BOX_HEIGHT // 2
-
-    spacing_x = 20
-    spacing_y = 8
-
-    return {
-        0: (center_y-3, box_left - 16),                        # Far left
-        1: (box_top - spacing_y, center_x - spacing_x),        # Top-left
-        2: (box_top - spacing_y, center_x + spacing_x),        # Top-right
-        3: (center_y-3, box_left + BOX_WIDTH + 16),            # Far right
-        4: (box_top + BOX_HEIGHT + 2, center_x + spacing_x),   # Bottom-right
-        5: (box_top + BOX_HEIGHT + 2, center_x - spacing_x),   # Bottom-left
-    }
-
+    return screen(stdscr).layout.positions
+
+BLANK_CARD = (
+    " _____",
+    "|     |",
+    "|     |",
+    "|     |",
+    "|_____|"
+)
+
+CARD_EDGE = (
+    "   | |",
+    "   | |",
+    "   | |",
+    "   | |",
+    "   |_|"
+)
+
+@functools.lru_cache(maxsize=None)
 def draw_card(value=None, suit=None):
     if value is None or suit is None:
-        card = [
-            " _____",
-            "|     |",
-            "|     |",
-            "|     |",
-            "|_____|"
-        ]
-    else:
-        val_str = f"{value:<2}"
-        card = [
-            " _____",
-            f"|{val_str}   |",
-            f"|  {suit}  |",
-            "|     |",
-            "|_____|"
-        ]
-    return card
+        return BLANK_CARD
+    val_str = f"{value:<2}"
+    return (
+        " _____",
+        f"|{val_str}   |",
+        f"|  {suit}  |",
+        "|     |",
+        "|_____|"
+    )
+
+def split_card(card_str):
+    # "10♥" -> ("10", "♥")
+    return card_str[:-1], card_str[-1]
+
+def put_card(stdscr, y, x_center, lines):
+    for i, line in enumerate(lines):
+        stdscr.addstr(y + i, x_center - len(line) // 2, line)
 
 def flip_card(stdscr, y, x_center, value, suit):
-    frames = [
-        [
-            " _____",
-            "|     |",
-            "|     |",
-            "|     |",
-            "|_____|"
-        ],
-        [
-            "   | |",
-            "   | |",
-            "   | |",
-            "   | |",
-            "   |_|"
-        ],
-        draw_card(value, suit)
-    ]
-    for frame in frames:
-        for i, line in enumerate(frame):
-            stdscr.addstr(y + i, x_center - len(line) // 2, line)
-        stdscr.refresh()
-        time.sleep(0.1)
+    for frame in (BLANK_CARD, CARD_EDGE, draw_card(value, suit)):
+        put_card(stdscr, y, x_center, frame)
+        update(stdscr)
+        pause(FRAME_DELAY)
 
 def flip_card_at_position(stdscr, seat_index, card_str):
-    positions = get_player_positions(stdscr)
-
-    y, x = positions[seat_index]
-
-    value = card_str[:-1]
-    suit = card_str[-1]
-
-    flip_card(stdscr, y + 1, x, value, suit)
-    #stdscr.refresh()
+    scr = screen(stdscr)
+    y, x = scr.layout.positions[seat_index]
+    scr.dirty.add(scr.layout.seat_cards[seat_index])
+    flip_card(stdscr, y + 1, x, *split_card(card_str))
 
 def draw_center_box(stdscr):
     max_y, max_x = stdscr.getmaxyx()
@@ -97,206 +187,175 @@ def draw_center_box(stdscr):
         else:
             stdscr.addstr(top + i, left, "|" + " " * (BOX_WIDTH - 2) + "|")
 
-def draw_player_label(stdscr, y, x_center, name, lives, isDealer):
-    label = f"{name} [ {lives} ]"
-    if isDealer:
-        stdscr.addstr(y, x_center - len(label) // 2, label, curses.A_UNDERLINE)
-    else:
-        stdscr.addstr(y, x_center - len(label) // 2, label)
+def draw_player_label(stdscr, seat, name, lives, isDealer):
+    # rewrites the seat's label only if it changed
+    scr = screen(stdscr)
+    y, x_center = scr.layout.positions[seat]
+    text = f"{name} [ {lives} ]"
+    attr = curses.A_UNDERLINE if isDealer else curses.A_NORMAL
+    label = (text, attr, y, x_center - len(text) // 2)
+    if scr.labels.get(seat) == label:
+        return
+    clear_player_label(stdscr, seat)
+    stdscr.addstr(label[2], label[3], text, attr)
+    scr.labels[seat] = label
+
+def clear_player_label(stdscr, seat):
+    scr = screen(stdscr)
+    old = scr.labels.pop(seat, None)
+    if old is not None:
+        text, attr, y, x = old
+        erase_region(stdscr, (y, x, 1, len(text)))
 
 def draw_blank_card(stdscr, y, x_center):
-    card = draw_card()
-    for i, line in enumerate(card):
-        stdscr.addstr(y + i, x_center - len(line) // 2, line)
+    put_card(stdscr, y, x_center, BLANK_CARD)
+
+def draw_center_card(stdscr, card):
+    scr = screen(stdscr)
+    layout = scr.layout
+    scr.dirty.add(layout.interior)
+    for i, line in enumerate(draw_card(*split_card(card))):
+        stdscr.addstr(layout.card_y + i, layout.card_x, line)
+    return layout
 
 def deal(stdscr, flip_order, card):
-    positions = get_player_positions(stdscr)
+    scr = screen(stdscr)
     for key in flip_order:
-        y, x = positions[key]
+        y, x = scr.layout.positions[key]
+        scr.dirty.add(scr.layout.seat_cards[key])
         draw_blank_card(stdscr, y + 1, x)
-        stdscr.refresh()
-        time.sleep(CARD_DELAY)
+        update(stdscr)
+        pause(CARD_DELAY)
 
     if card == "NONE":
         return
 
-    value = card[:-1]
-    suit = card[-1]
-
-    max_y, max_x = stdscr.getmaxyx()
-    card_lines = draw_card(value, suit)
-
-    card_height = len(card_lines)
-    card_width = max(len(line) for line in card_lines)
-
-    # Find the top-left corner of the table box
-    table_top = (max_y - BOX_HEIGHT) // 2
-    table_left = (max_x - BOX_WIDTH) // 2
-
-    # Center card inside the table
-    card_y = table_top + (BOX_HEIGHT - card_height) // 2
-    card_x = table_left + (BOX_WIDTH - card_width) // 2
-
-    for i, line in enumerate(card_lines):
-        stdscr.addstr(card_y + i, card_x, line)
-
-    stdscr.refresh()
-
-    stdscr.refresh()
+    draw_center_card(stdscr, card)
+    update(stdscr)
 
 
 def reveal_cards(stdscr, flip_order, values):
-    positions = get_player_positions(stdscr)
+    scr = screen(stdscr)
 
     for key in flip_order:
-        y, x = positions[key]
+        y, x = scr.layout.positions[key]
         cards = values[key]
 
         if cards[0][0] == "K":
             continue
-        
+
+        scr.dirty.add(scr.layout.seat_cards[key])
         for i, card_str in enumerate(cards):
-            value = card_str[:-1]
-            suit = card_str[-1]
             x_offset = x + i * 8  # Adjust horizontal space between cards
-            flip_card(stdscr, y + 1, x_offset, value, suit)
-            stdscr.refresh()
-            time.sleep(CARD_DELAY)
+            flip_card(stdscr, y + 1, x_offset, *split_card(card_str))
+            pause(CARD_DELAY)
 
 def player_action(stdscr, seat, action):
-    positions = get_player_positions(stdscr)
-    y, x = positions[seat]
+    scr = screen(stdscr)
+    y, x = scr.layout.positions[seat]
+    scr.dirty.add(scr.layout.seat_cards[seat])
     stdscr.addstr(y + 7, x - len(action) // 2, action)
-    stdscr.refresh()
+    update(stdscr)
 
 def table_message(stdscr, message):
+    scr = screen(stdscr)
     clear_waiting(stdscr)
+    scr.dirty.add((scr.layout.message_y, scr.layout.box_left + 1, 1, BOX_WIDTH - 2))
     max_y, max_x = stdscr.getmaxyx()
-    msg_y = (max_y - 10) // 2 + 4
     msg_x = (max_x - len(message)) // 2
-    stdscr.addstr(msg_y, msg_x, message, curses.A_BOLD)
-    stdscr.refresh()
+    stdscr.addstr(scr.layout.message_y, msg_x, message, curses.A_BOLD)
+    update(stdscr)
 
 def clear_waiting(stdscr):
-    max_y, max_x = stdscr.getmaxyx()
-    msg_y = (max_y - BOX_HEIGHT) // 2 + 4
-    filler = "|" + " " * 58 + "|"
-    msg_x = (max_x - len(filler)) // 2
-    stdscr.addstr(msg_y, msg_x, filler)
-    stdscr.refresh()
+    layout = screen(stdscr).layout
+    erase_region(stdscr, (layout.message_y, layout.box_left + 1, 1, BOX_WIDTH - 2))
 
 
 def draw_table(stdscr, players):
-    stdscr.clear()
-    max_y, max_x = stdscr.getmaxyx()
-
-    draw_center_box(stdscr)
-
-    positions = get_player_positions(stdscr)
+    # Blank whatever the last round drew, then bring the labels up to date
+    global _players
+    _players = dict(players)
+    scr = screen(stdscr)
+    for region in scr.dirty:
+        erase_region(stdscr, region)
+        # a label under an erased region has to be drawn again
+        top, left, height, width = region
+        for seat, (text, attr, y, x) in list(scr.labels.items()):
+            if top <= y < top + height and x < left + width and left < x + len(text):
+                del scr.labels[seat]
+    scr.dirty.clear()
 
     for i in range(6):
         if i in players:
             name, lives, isDealer = players[i]
-            y, x = positions[i]
-            draw_player_label(stdscr, y, x, name, lives, isDealer)
-
-    stdscr.refresh()
-
-def decision_card(stdscr, card):
-    value = card[:-1]
-    suit = card[-1]
-
-    max_y, max_x = stdscr.getmaxyx()
-    card_lines = draw_card(value, suit)
-
-    card_height = len(card_lines)
-    card_width = max(len(line) for line in card_lines)
-
-    # Calculate the center of the table box, not the whole screen
-    table_top = (max_y - BOX_HEIGHT) // 2
-    table_left = (max_x - BOX_WIDTH) // 2
+            draw_player_label(stdscr, i, name, lives, isDealer)
+        else:
+            clear_player_label(stdscr, i)
 
-    # Center inside the box
-    card_y = table_top + (BOX_HEIGHT - card_height) // 2
-    card_x = table_left + (BOX_WIDTH - card_width) // 2
+    update(stdscr)
 
-    for i, line in enumerate(card_lines):
-        stdscr.addstr(card_y + i, card_x, line)
+def decision_card(stdscr, card, deadline=None):
+    # deadline: seconds before the server plays 'keep' for us, shown as a
+    # countdown next to the prompt
+    layout = draw_center_card(stdscr, card)
 
     prompt = "[s] switch || [k] keep"
-    prompt_x = table_left + (BOX_WIDTH - len(prompt)) // 2
-    stdscr.addstr(card_y + card_height + 1, prompt_x, prompt)
+    prompt_x = layout.box_left + (BOX_WIDTH - len(prompt)) // 2
+    stdscr.addstr(layout.prompt_y, prompt_x, prompt)
 
-    stdscr.refresh()
+    update(stdscr)
 
     flush_input_curses(stdscr)
-    
-    decision = 'keep\n'
+
+    decision = 'keep'
+    if deadline is not None:
+        end = time.time() + deadline
+        stdscr.timeout(200)
     while True:
+        if deadline is not None:
+            remaining = end - time.time()
+            if remaining <= 0:
+                break
+            stdscr.addstr(layout.prompt_y, prompt_x + len(prompt) + 2, f"{int(remaining) + 1:2}s")
+            update(stdscr)
         key = stdscr.getch()
         if key == ord('s'):
-            decision = 'switch\n'
+            decision = 'switch'
             break
         elif key == ord('k'):
             break
+    stdscr.timeout(-1)
 
-    stdscr.move(card_y + card_height + 1, prompt_x)
-
-    # replace prompt with table edges
-    stdscr.addstr(card_y + card_height + 1, prompt_x - 19 , "|                                                          |")
-    stdscr.clrtoeol()
-    stdscr.refresh()
+    # blank the prompt line inside the table edges
+    erase_region(stdscr, (layout.prompt_y, layout.box_left + 1, 1, BOX_WIDTH - 2))
+    update(stdscr)
     return decision
 
 def new_card(stdscr, card):
-    value = card[:-1]
-    suit = card[-1]
-
-    max_y, max_x = stdscr.getmaxyx()
-    card_lines = draw_card(value, suit)
-
-    card_height = len(card_lines)
-    card_width = max(len(line) for line in card_lines)
-
-    # Find the top-left corner of the table box
-    table_top = (max_y - BOX_HEIGHT) // 2
-    table_left = (max_x - BOX_WIDTH) // 2
-
-    # Center card inside the table
-    card_y = table_top + (BOX_HEIGHT - card_height) // 2
-    card_x = table_left + (BOX_WIDTH - card_width) // 2
-
-    for i, line in enumerate(card_lines):
-        stdscr.addstr(card_y + i, card_x, line)
-
-    stdscr.refresh()
+    draw_center_card(stdscr, card)
+    update(stdscr)
 
 def losers(stdscr, usernames, cards):
+    scr = screen(stdscr)
     max_y, max_x = stdscr.getmaxyx()
+    scr.dirty.add(scr.layout.banner)
 
     # Centered message at the top
     message = f"{', '.join(usernames)} lost with"
     msg_x = (max_x - len(message)) // 2
     stdscr.addstr(2, msg_x, message)
 
-    # Use one card to determine card dimensions
-    sample_card = draw_card("A", "♠")
-    card_width = len(sample_card[0])
-    card_height = len(sample_card)
-
     total = len(cards)
     spacing = 4
-    total_width = total * card_width + (total - 1) * spacing
+    total_width = total * CARD_WIDTH + (total - 1) * spacing
     start_x = (max_x - total_width) // 2
     card_y = 4  # Line where cards start
 
     for i, card_str in enumerate(cards):
-        value = card_str[:-1]
-        suit = card_str[-1]
-        card_lines = draw_card(value, suit)
-        card_x = start_x + i * (card_width + spacing)
+        card_lines = draw_card(*split_card(card_str))
+        card_x = start_x + i * (CARD_WIDTH + spacing)
 
         for j, line in enumerate(card_lines):
             stdscr.addstr(card_y + j, card_x, line)
 
-    stdscr.refresh()
+    update(stdscr)